@@ -1,63 +1,1539 @@
+import argparse
+import asyncio
+import bisect
+import cProfile
+import csv
+import functools
+import gzip
+import hashlib
+import io
+import heapq
+import json
+import mmap
 import os
+import platform
+import pstats
+import random
+import re
+import signal
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import accumulate
+from operator import itemgetter
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+try:
+    import numpy as np
+except ImportError:  # only needed for the analytics command
+    np = None
 
 #FILE HANDLING SECTION--------------
 file_path = r"C:\Users\DanielUdasco\Desktop\Workshop3_FinalProject\inventory_data\inventory.txt"
 
+# Journal settings (changes are appended to inventory.txt.log instead of rewriting the whole file)
+JOURNAL_MODE = True
+JOURNAL_SYNC_EVERY = 32        # fsync after this many records...
+JOURNAL_SYNC_INTERVAL = 1.0    # ...or at the first record this many seconds after the last fsync;
+                               # the menu also syncs before it waits for input (see sync_storage)
+JOURNAL_COMPACT_AFTER = 1000   # fold the log back into inventory.txt after this many records
+journal = {'file': None, 'pending': 0, 'records': 0, 'last_sync': 0.0, 'offset': 0, 'generation': 0}
+
 #CREATE inventory.txt if it doesn't exist
 def initialize_inventory_file():
 
     dir_path = os.path.dirname(file_path)
-    if not os.path.exists(dir_path):
+    if dir_path and not os.path.exists(dir_path):
         os.makedirs(dir_path)
 
     if not os.path.exists(file_path):
-        with open(file_path, 'w') as f:
+        with open(file_path, 'w', encoding='utf-8') as f:
             pass  # just create an empty file
 
+#READ inventory.txt one line at a time, yielding (id, name, quantity, price)
+# Bad lines are skipped and recorded in errors as (line number, reason)
+def parse_inventory_lines(f, errors=None):
+    for line_no, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        parts = line.split(",")
+        if len(parts) != 4:
+            reason = f"expected 4 fields, found {len(parts)}"
+        else:
+            try:
+                item_id = int(parts[0])
+                name = parts[1].strip()
+                qty = int(parts[2])
+                price = float(parts[3])
+            except ValueError as e:
+                reason = str(e)
+            else:
+                if not name:
+                    reason = "empty name"
+                elif item_id < 0 or qty < 0 or price < 0:
+                    reason = "negative value"
+                elif item_id > MAX_INT or qty > MAX_INT:
+                    reason = "value too large"
+                else:
+                    yield item_id, name, qty, price
+                    continue
+        if errors is not None:
+            errors.append((line_no, reason))
+
+def iter_inventory_file(path=None, errors=None):
+    with open(path or file_path, 'r', encoding='utf-8', errors='replace') as f:
+        yield from parse_inventory_lines(f, errors)
+
 #LOAD items from inventory.txt (for functions like View_all_items)
+# Lines that could not be read are kept in load_errors
+load_errors = []
+
 def load_inventory():
-    items = []
+    items = Inventory()
+    load_errors.clear()
+    journal['generation'] = read_generation()
     if not os.path.exists(file_path):
-        return items
+        return replay_journal(items)
     try:
-        with open(file_path, 'r') as f:
-            lines = f.readlines()
-            for line in lines:
-                if line.strip():
-                    parts = line.strip().split(",")
-                    if len(parts) == 4:
-                        item_id = int(parts[0])
-                        name = parts[1].strip()
-                        qty = int(parts[2])
-                        price = float(parts[3])
-                        items.append({
-                            'id': item_id,
-                            'name': name,
-                            'quantity': qty,
-                            'price': price
-                        })
+        if is_binary_snapshot(file_path):
+            items = load_binary_snapshot(file_path)
+            return replay_journal(items)
+        loaded = None
+        if PARALLEL_LOAD and os.path.getsize(file_path) >= PARALLEL_LOAD_MIN_BYTES:
+            loaded = load_inventory_parallel(file_path, load_errors)
+        if loaded:
+            items, duplicates = loaded
+        else:
+            duplicates = []
+            for item_id, name, qty, price in iter_inventory_file(file_path, load_errors):
+                if item_id in items:
+                    duplicates.append(item_id)
+                items.put(item_id, name, qty, price)
+        if duplicates:
+            print(f"Warning: {len(duplicates)} duplicate ID(s) in {file_path} (e.g. {duplicates[:5]}), "
+                  "the last line for each was kept", file=sys.stderr)
     except Exception as e:
-        print(f"Error loading inventory: {e}")
-    return items
+        print(f"Error loading inventory: {e}", file=sys.stderr)
+    if load_errors:
+        print(f"Warning: skipped {len(load_errors)} bad line(s) in {file_path}", file=sys.stderr)
+        for line_no, reason in load_errors[:5]:
+            print(f"  line {line_no}: {reason}", file=sys.stderr)
+    items.dirty.clear()  # everything loaded is already on disk
+    return replay_journal(items)
+
+#WRITE a whole file safely: write a temp file next to it, fsync, then rename over the old one,
+# so a crash or Ctrl+C leaves either the old or the new file, never half of one
+def write_atomically(path, write, mode='w'):
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, mode, encoding=None if 'b' in mode else 'utf-8') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if os.name != 'nt':  # make the rename itself durable
+        dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
 
-#SAVE items from inventory.txt (for functions later on)
+#SAVE items from inventory.txt (for functions later on), returns True if it worked
 def save_inventory(items):
     try:
-        with open(file_path, 'w') as f:
-            for item in items:
-                f.write(f"{item['id']},{item['name']},{item['quantity']},{item['price']}\n")
+        if (SNAPSHOT_FORMAT or store_format()) == 'binary':
+            save_binary_snapshot(items, file_path)
+        else:
+            def write_rows(f):
+                for item_id, name, qty, price in items.rows():
+                    f.write(f"{item_id},{name},{qty},{price}\n")
+            write_atomically(file_path, write_rows)
     except Exception as e:
-        print(f"Error saving inventory: {e}")
+        print(f"Error saving inventory: {e}", file=sys.stderr)
+        return False
+    items.dirty.clear()
+    bump_generation()
+    return True
+
+#GENERATION counter, +1 every time inventory.txt is rewritten (lets other processes notice)
+def get_generation_path():
+    return file_path + ".gen"
+
+def read_generation():
+    try:
+        with open(get_generation_path(), 'r') as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+def bump_generation():
+    generation = read_generation() + 1
+    write_atomically(get_generation_path(), lambda f: f.write(str(generation)))
+    journal['generation'] = generation
 
 #END OF FILE HANDLING SECTION-------------
 
 
+#PARALLEL LOAD SECTION--------------
+# Big inventory.txt files are parsed on every core: the file is cut into byte ranges that
+# start and end on a line break, each worker process parses one range into column arrays
+# (with the same parse_inventory_lines rules), and the arrays are joined into one Inventory.
+# Like the normal loader, the last line wins when an ID appears twice. Files smaller than
+# PARALLEL_LOAD_MIN_BYTES (where starting the processes costs more than it saves), or a
+# machine that can't start them, use the normal one-line-at-a-time loader
+PARALLEL_LOAD = True
+PARALLEL_LOAD_MIN_BYTES = 32 * 1024 * 1024
+PARALLEL_LOAD_WORKERS = None  # None = one per core
+
+# [(start, end)] byte ranges of about the same size, each ending just after a line break
+def split_file_ranges(path, parts):
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, 'rb') as f:
+        for part in range(1, parts):
+            f.seek(max(size * part // parts, bounds[-1]))
+            f.readline()  # move on to the start of the next line
+            bounds.append(min(f.tell(), size))
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+# Runs in a worker: parse one byte range into columns. Returns (ids, quantities, prices,
+# name_len, names, errors with line numbers counted from the start of the range,
+# number of lines in the range, True if the IDs are strictly increasing)
+def parse_inventory_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    ids, quantities, prices, name_len = array('q'), array('q'), array('d'), array('i')
+    names = bytearray()
+    errors = []
+    increasing = True
+    last_id = -1
+    for item_id, name, qty, price in parse_inventory_lines(io.TextIOWrapper(io.BytesIO(data), encoding='utf-8', errors='replace'), errors):
+        data_name = name.encode('utf-8')
+        if item_id <= last_id:
+            increasing = False
+        last_id = item_id
+        ids.append(item_id)
+        quantities.append(qty)
+        prices.append(price)
+        name_len.append(len(data_name))
+        names += data_name
+    return ids, quantities, prices, name_len, bytes(names), errors, data.count(b"\n"), increasing
+
+# (Inventory, [duplicate IDs]), or None if no worker processes could be started.
+# Bad lines are added to errors as (line number, reason)
+def load_inventory_parallel(path, errors, workers=None):
+    workers = workers or PARALLEL_LOAD_WORKERS or os.cpu_count() or 1
+    ranges = split_file_ranges(path, workers)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(parse_inventory_range, [path] * len(ranges),
+                                  [start for start, _ in ranges], [end for _, end in ranges]))
+    except (OSError, RuntimeError, ImportError):  # e.g. a sandbox that doesn't allow new processes
+        return None
+
+    ids, quantities, prices, name_len = array('q'), array('q'), array('d'), array('i')
+    names = bytearray()
+    lines_before = 0
+    in_order = True
+    for part_ids, part_quantities, part_prices, part_name_len, part_names, part_errors, lines, increasing in parts:
+        if not increasing or (ids and part_ids and part_ids[0] <= ids[-1]):
+            in_order = False
+        ids += part_ids
+        quantities += part_quantities
+        prices += part_prices
+        name_len += part_name_len
+        names += part_names
+        errors.extend((lines_before + line_no, reason) for line_no, reason in part_errors)
+        lines_before += lines
+    name_start = array('q', accumulate(name_len, initial=0))
+    name_start.pop()
+
+    duplicates = []
+    if not in_order and len(set(ids)) != len(ids):
+        last_row = {}
+        for row, item_id in enumerate(ids):
+            if item_id in last_row:
+                duplicates.append(item_id)
+                ids[last_row[item_id]] = DELETED  # the later line wins, like Inventory.put
+            last_row[item_id] = row
+    items = Inventory.from_columns(ids, quantities, prices, name_start, name_len, names)
+    if duplicates:
+        items.compact()
+    return items, duplicates
+
+#END OF PARALLEL LOAD SECTION-------------
+
+
+#BINARY SNAPSHOT SECTION--------------
+# Optional fixed-width binary format for inventory.txt. Layout (little-endian):
+#   header   magic "IMSB", version, item count, name heap size
+#   columns  ids (int64), quantities (int64), prices (float64),
+#            name offsets (int64), name lengths (int32), one block each
+#   heap     all names as utf-8, back to back
+# Each column block maps straight onto one of the Inventory arrays, so loading is
+# a handful of memory copies out of an mmap instead of parsing every line.
+# The convert command switches a store between the two formats; saving keeps the one in use.
+SNAPSHOT_FORMAT = None  # format save_inventory writes: 'text', 'binary', or None to keep the file's
+BINARY_MAGIC = b"IMSB"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("<4sHxxQQ")
+BINARY_COLUMNS = (('ids', 'q'), ('quantities', 'q'), ('prices', 'd'), ('name_start', 'q'), ('name_len', 'i'))
+
+def is_binary_snapshot(path):
+    with open(path, 'rb') as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+def load_binary_snapshot(path):
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, version, count, heap_size = BINARY_HEADER.unpack_from(mm, 0)
+            if magic != BINARY_MAGIC or version != BINARY_VERSION:
+                raise ValueError(f"not a version {BINARY_VERSION} inventory snapshot")
+            offset = BINARY_HEADER.size
+            columns = []
+            for _, typecode in BINARY_COLUMNS:
+                column = array(typecode)
+                size = count * column.itemsize
+                column.frombytes(mm[offset:offset + size])
+                if sys.byteorder == 'big':
+                    column.byteswap()
+                columns.append(column)
+                offset += size
+            names = bytearray(mm[offset:offset + heap_size])
+            if len(names) != heap_size:
+                raise ValueError("snapshot is truncated")
+    return Inventory.from_columns(*columns, names)
+
+def save_binary_snapshot(inventory, path):
+    if inventory.deleted:
+        inventory.compact()  # only live rows go into the snapshot
+    header = BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(inventory.ids), len(inventory.names))
+    def write_snapshot(f):
+        f.write(header)
+        for attr, _ in BINARY_COLUMNS:
+            column = getattr(inventory, attr)
+            if sys.byteorder == 'big':
+                column = array(column.typecode, column)
+                column.byteswap()
+            column.tofile(f)
+        f.write(inventory.names)
+    write_atomically(path, write_snapshot, 'wb')
+
+# 'binary' or 'text', the format inventory.txt is in now (text if it does not exist yet)
+def store_format():
+    try:
+        return 'binary' if is_binary_snapshot(file_path) else 'text'
+    except FileNotFoundError:
+        return 'text'
+
+# Convert inventory.txt between the comma-separated format and the binary one (the journal
+# is folded in); later saves keep the new format. Returns the number of items
+def convert_inventory(inventory, fmt):
+    global SNAPSHOT_FORMAT
+    if fmt not in ('text', 'binary'):
+        raise ValueError(f"Unknown format: {fmt}")
+    saved = SNAPSHOT_FORMAT
+    SNAPSHOT_FORMAT = fmt
+    try:
+        with write_lock(inventory):
+            compact_inventory(inventory)
+    finally:
+        SNAPSHOT_FORMAT = saved
+    if store_format() != fmt:
+        raise OSError(f"Could not save {file_path} in the {fmt} format")
+    return len(inventory)
+
+#END OF BINARY SNAPSHOT SECTION-------------
+
+
+#JOURNAL SECTION--------------
+# Each line of the log is one change:  "+,id,name,quantity,price"  or  "-,id"
+def get_journal_path():
+    return file_path + ".log"
+
+# Apply the log on top of the items loaded from inventory.txt
+# (or, from byte offset start, the records other processes added since we last looked)
+def replay_journal(items, start=0):
+    if start == 0:
+        journal['records'] = 0
+    journal['offset'] = start
+    path = get_journal_path()
+    if not os.path.exists(path):
+        return items
+    unsaved = set(items.dirty)  # replayed records are already on disk
+    try:
+        for size, record in iter_journal(path, start):
+            journal['offset'] += size
+            if record is None:
+                continue
+            if len(record) == 4:
+                items.put(*record)
+            elif record[0] in items:
+                items.remove(record[0])
+            journal['records'] += 1
+    except Exception as e:
+        print(f"Error reading journal: {e}", file=sys.stderr)
+    items.dirty = unsaved
+    return items
+
+# (line size, record) for every complete line of the log from byte offset start; the record
+# is (id, name, quantity, price) for "+", (id,) for "-", or None if the line cannot be read
+def iter_journal(path, start=0):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # a half-written last line after a crash
+            parts = line.decode('utf-8', 'replace').rstrip("\n").split(",")
+            record = None
+            try:
+                if parts[0] == '+' and len(parts) >= 5:
+                    record = (int(parts[1]), ",".join(parts[2:-2]).strip(), int(parts[-2]), float(parts[-1]))
+                elif parts[0] == '-' and len(parts) == 2:
+                    record = (int(parts[1]),)
+            except ValueError:
+                pass
+            yield len(line), record
+
+# Write one change to the log (fsync is batched, see JOURNAL_SYNC_EVERY;
+# with sync=False the caller calls sync_journal() itself)
+def append_journal(item, deleted=False, sync=True):
+    if journal['file'] is None:
+        journal['file'] = open(get_journal_path(), 'ab')
+        journal['last_sync'] = time.monotonic()
+        if journal['file'].tell() > journal['offset']:
+            journal['file'].write(b"\n")  # end a half-written line left by a crash
+    f = journal['file']
+    if deleted:
+        f.write(f"-,{item['id']}\n".encode('utf-8'))
+    else:
+        f.write(f"+,{item['id']},{item['name']},{item['quantity']},{item['price']}\n".encode('utf-8'))
+    f.flush()
+    journal['offset'] = f.tell()
+    journal['pending'] += 1
+    journal['records'] += 1
+    now = time.monotonic()
+    if sync and (journal['pending'] >= JOURNAL_SYNC_EVERY or now - journal['last_sync'] >= JOURNAL_SYNC_INTERVAL):
+        sync_journal()
+
+# Force pending log records to disk
+def sync_journal():
+    f = journal['file']
+    if f is None or not journal['pending']:
+        return
+    f.flush()
+    os.fsync(f.fileno())
+    journal['pending'] = 0
+    journal['last_sync'] = time.monotonic()
+
+def close_journal():
+    if journal['file'] is not None:
+        sync_journal()
+        journal['file'].close()
+        journal['file'] = None
+
+# Fold the log back into a fresh inventory.txt snapshot, then empty the log
+def compact_inventory(inventory):
+    close_journal()
+    if not save_inventory(inventory):
+        return  # keep the log, it still holds the changes
+    try:
+        if os.path.exists(get_journal_path()):
+            os.remove(get_journal_path())
+        journal['records'] = 0
+        journal['offset'] = 0
+    except Exception as e:
+        print(f"Error compacting inventory: {e}", file=sys.stderr)
+
+#END OF JOURNAL SECTION-------------
+
+
+#INDEX SECTION--------------
+# Keeps the row of every ID (O(1) lookups) and an inverted index of 3-letter chunks
+# of the normalized names, so a name search only checks items sharing a chunk.
+# Names are normalized by lower-casing and turning punctuation into spaces (one
+# character for one, so a substring of a name is still a substring after normalizing),
+# then padded with a space on each side so word starts and short words get chunks too.
+# Postings are compact append-only arrays; IDs left behind by a delete or rename are
+# filtered out when the search checks the real name, and dropped by Inventory.compact().
+# The postings are only built the first time a name search needs them.
+NON_WORD = re.compile(r"[\W_]")
+
+class InventoryIndex:
+    GRAM = 3
+
+    def __init__(self, inventory):
+        self.inventory = inventory
+        self.by_id = {}
+        self.postings = None
+
+    @staticmethod
+    def normalize(text):
+        return NON_WORD.sub(" ", text.lower())
+
+    @classmethod
+    def grams(cls, text, padded=False):
+        text = cls.normalize(text)
+        if padded:
+            text = f" {text} "
+        return {text[i:i + cls.GRAM] for i in range(len(text) - cls.GRAM + 1)}
+
+    def add(self, item_id, row, name):
+        self.by_id[item_id] = row
+        if self.postings is not None:
+            self.add_postings(item_id, name)
+
+    def add_postings(self, item_id, name):
+        postings = self.postings
+        for gram in self.grams(name, padded=True):
+            ids = postings.get(gram)
+            if ids is None:
+                postings[gram] = ids = array('q')
+            ids.append(item_id)
+
+    def remove(self, item_id):
+        self.by_id.pop(item_id, None)
+
+    def rename(self, item_id, new_name):
+        self.add(item_id, self.by_id[item_id], new_name)
+
+    def build_postings(self):
+        self.postings = {}
+        for item_id, row in self.by_id.items():
+            self.add_postings(item_id, self.inventory.name_at(row))
+
+    # IDs that may contain search_term (every ID if the term is too short to index)
+    def candidates(self, search_term):
+        if len(search_term) < self.GRAM:
+            return self.by_id.keys()
+        if self.postings is None:
+            self.build_postings()
+        shortest = None
+        for gram in self.grams(search_term):
+            ids = self.postings.get(gram)
+            if ids is None:
+                return ()
+            if shortest is None or len(ids) < len(shortest):
+                shortest = ids
+        return {i for i in shortest if i in self.by_id}
+
+    # Up to k (score, id) pairs for the names most similar to query, best first.
+    # Score = share of chunks in common (Dice coefficient), plus a boost when the
+    # name starts with the query (or one of its words does), so typos and
+    # "sardine"/"Sardines" still find the item
+    def rank(self, query, k=10, min_score=0.25):
+        query_grams = self.grams(query, padded=True)
+        query_text = self.normalize(query).strip()
+        if not query_text:
+            return []
+        if self.postings is None:
+            self.build_postings()
+        posting_lists = sorted((self.postings[g] for g in query_grams if g in self.postings), key=len)
+        if not posting_lists:
+            return []
+        # chunks shared by a big part of the catalog barely help ranking and cost the most to count
+        common = max(1000, len(self.by_id) // 20)
+        counts = Counter()
+        for ids in [p for p in posting_lists if len(p) <= common] or posting_lists[:1]:
+            counts.update(ids)
+        scored = []
+        for item_id, _ in heapq.nlargest(max(50, k * 10), counts.items(), key=itemgetter(1)):
+            row = self.by_id.get(item_id)
+            if row is None:
+                continue
+            name = self.normalize(self.inventory.name_at(row))
+            name_grams = self.grams(name, padded=True)
+            score = 2 * len(query_grams & name_grams) / (len(query_grams) + len(name_grams))
+            if name.startswith(query_text):
+                score += 0.5
+            elif f" {query_text}" in f" {name}":
+                score += 0.25
+            if score >= min_score:
+                scored.append((score, item_id))
+        return heapq.nlargest(k, scored)
+
+#END OF INDEX SECTION-------------
+
+
+#INVENTORY STORE SECTION--------------
+DELETED = -1  # ID stored in a row whose item was deleted
+MAX_INT = 2 ** 63 - 1  # largest ID or quantity the array('q') columns can hold
+
+# One item of the Inventory; reads and writes go straight to the columns,
+# so menu functions can keep using item['name'], item['quantity'] = ..., etc.
+class ItemRow:
+    __slots__ = ('inventory', 'item_id')
+    FIELDS = ('id', 'name', 'quantity', 'price')
+
+    def __init__(self, inventory, item_id):
+        self.inventory = inventory
+        self.item_id = item_id
+
+    def __getitem__(self, key):
+        if key == 'id':
+            return self.item_id  # still readable after the item is removed
+        return self.inventory.get_field(self.item_id, key)
+
+    def __setitem__(self, key, value):
+        self.inventory.set_field(self.item_id, key, value)
+
+    def __eq__(self, other):
+        if isinstance(other, ItemRow):
+            return self.inventory is other.inventory and self.item_id == other.item_id
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.item_id)
+
+    def keys(self):
+        return self.FIELDS
+
+    def to_dict(self):
+        return {key: self[key] for key in self.FIELDS}
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+# Column store: IDs and quantities in array('q'), prices in array('d') and the
+# names packed into one utf-8 bytearray (start/length per row).
+# Deleted rows are marked with DELETED and squeezed out by compact().
+class Inventory:
+    def __init__(self, items=()):
+        self.ids = array('q')
+        self.quantities = array('q')
+        self.prices = array('d')
+        self.name_start = array('q')
+        self.name_len = array('i')
+        self.names = bytearray()
+        self.garbage = 0  # bytes in self.names no longer used by any row
+        self.deleted = 0  # rows marked DELETED
+        self.dirty = set()  # IDs changed since they were last saved
+        self.changed = None  # when set to a set(), collects every changed ID (see InventoryServer)
+        self.version = 0  # +1 on every change, so cached views know when to rebuild
+        self.sort_cache = {}
+        self._index = InventoryIndex(self)
+        self._low_stock = None  # built on first use, see low_stock
+        self._totals = None  # built on first use, see totals
+        self._id_allocator = None  # built on first use, see id_allocator
+        for item in items:
+            self.append(item)
+
+    # Build an Inventory straight from column arrays (e.g. read from a binary snapshot)
+    @classmethod
+    def from_columns(cls, ids, quantities, prices, name_start, name_len, names):
+        inventory = cls()
+        inventory.ids = ids
+        inventory.quantities = quantities
+        inventory.prices = prices
+        inventory.name_start = name_start
+        inventory.name_len = name_len
+        inventory.names = names
+        inventory.deleted = ids.count(DELETED)
+        inventory._index = None  # built on the first lookup, see index
+        return inventory
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = InventoryIndex(self)
+            self._index.by_id = {item_id: row for row, item_id in enumerate(self.ids) if item_id != DELETED}
+        return self._index
+
+    # LowStockIndex of this inventory, rebuilt if another process changed the thresholds file
+    @property
+    def low_stock(self):
+        mtime = get_thresholds_mtime()
+        if self._low_stock is None or self._low_stock.mtime != mtime:
+            self._low_stock = LowStockIndex(self, load_thresholds(), mtime)
+        return self._low_stock
+
+    # InventoryTotals of this inventory, kept up to date from then on
+    @property
+    def totals(self):
+        if self._totals is None:
+            self._totals = InventoryTotals(self)
+        return self._totals
+
+    @property
+    def analytics(self):
+        return InventoryAnalytics(self)
+
+    @property
+    def id_allocator(self):
+        if self._id_allocator is None:
+            self._id_allocator = IdAllocator(self, read_high_water())
+        return self._id_allocator
+
+    def __len__(self):
+        return len(self.ids) - self.deleted
+
+    def __contains__(self, item_id):
+        return item_id in self.index.by_id
+
+    def __iter__(self):
+        for item_id in self.ids:
+            if item_id != DELETED:
+                yield ItemRow(self, item_id)
+
+    # Plain (id, name, quantity, price) tuples in file order, for saving and reports
+    def rows(self):
+        names = self.names
+        for row, item_id in enumerate(self.ids):
+            if item_id != DELETED:
+                start = self.name_start[row]
+                yield (item_id, names[start:start + self.name_len[row]].decode('utf-8'),
+                       self.quantities[row], self.prices[row])
+
+    def get(self, item_id):
+        return ItemRow(self, item_id) if item_id in self.index.by_id else None
+
+    def row_values(self, row):
+        return self.ids[row], self.name_at(row), self.quantities[row], self.prices[row]
+
+    # Row numbers of the live items sorted by 'id', 'name', 'quantity' or 'price',
+    # optionally only those with quantity below a threshold. Cached until the next change
+    def sorted_rows(self, sort_by='id', reverse=False, below=None):
+        cache_key = (sort_by, reverse, below)
+        cached = self.sort_cache.get(cache_key)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        if sort_by == 'name':
+            key = lambda row: self.name_at(row).lower()
+        elif sort_by in ('id', 'quantity', 'price'):
+            key = {'id': self.ids, 'quantity': self.quantities, 'price': self.prices}[sort_by].__getitem__
+        else:
+            raise ValueError(f"Cannot sort by {sort_by}")
+        ids, quantities = self.ids, self.quantities
+        rows = [row for row in range(len(ids))
+                if ids[row] != DELETED and (below is None or quantities[row] < below)]
+        rows.sort(key=key, reverse=reverse)
+        rows = array('q', rows)
+        self.sort_cache[cache_key] = (self.version, rows)
+        return rows
+
+    def name_at(self, row):
+        start = self.name_start[row]
+        return self.names[start:start + self.name_len[row]].decode('utf-8')
+
+    def get_field(self, item_id, key):
+        row = self.index.by_id[item_id]
+        if key == 'id':
+            return item_id
+        if key == 'name':
+            return self.name_at(row)
+        if key == 'quantity':
+            return self.quantities[row]
+        if key == 'price':
+            return self.prices[row]
+        raise KeyError(key)
+
+    def set_field(self, item_id, key, value):
+        if self.get_field(item_id, key) == value:
+            return
+        row = self.index.by_id[item_id]
+        if key == 'name':
+            self.store_name(row, value)
+            self.index.rename(item_id, value)
+        elif key in ('quantity', 'price'):
+            try:  # check the value fits before anything changes
+                array('q' if key == 'quantity' else 'd', [value])
+            except (OverflowError, TypeError) as e:
+                raise ValueError(f"Cannot store {key} {value!r}: {e}")
+            if self._totals is not None:
+                self._totals.remove(item_id, self.quantities[row], self.prices[row])
+            if key == 'quantity':
+                self.quantities[row] = value
+            else:
+                self.prices[row] = value
+            if self._totals is not None:
+                self._totals.add(item_id, self.quantities[row], self.prices[row])
+            if self._low_stock is not None:
+                self._low_stock.update(item_id, self.quantities[row])
+        else:
+            raise KeyError(key)
+        self.dirty.add(item_id)
+        if self.changed is not None:
+            self.changed.add(item_id)
+        self.version += 1
+
+    def store_name(self, row, name):
+        data = name.encode('utf-8')
+        self.garbage += self.name_len[row]
+        self.name_start[row] = len(self.names)
+        self.name_len[row] = len(data)
+        self.names += data
+
+    # Add an item, or overwrite the one that already has this ID
+    def put(self, item_id, name, quantity, price):
+        try:  # everything that can fail, before the index or any column changes
+            new_ids, new_quantities, new_prices = array('q', [item_id]), array('q', [quantity]), array('d', [price])
+        except (OverflowError, TypeError) as e:
+            raise ValueError(f"Cannot store item {item_id}: {e}")
+        if item_id in self.index.by_id:
+            item = ItemRow(self, item_id)
+            item['name'] = name
+            item['quantity'] = quantity
+            item['price'] = price
+            return item
+        data = name.encode('utf-8')
+        self.index.add(item_id, len(self.ids), name)
+        self.ids += new_ids
+        self.quantities += new_quantities
+        self.prices += new_prices
+        self.name_start.append(len(self.names))
+        self.name_len.append(len(data))
+        self.names += data
+        self.dirty.add(item_id)
+        if self.changed is not None:
+            self.changed.add(item_id)
+        self.version += 1
+        if self._low_stock is not None:
+            self._low_stock.update(item_id, quantity)
+        if self._totals is not None:
+            self._totals.add(item_id, quantity, price)
+        if self._id_allocator is not None:
+            self._id_allocator.added(item_id)
+        return ItemRow(self, item_id)
+
+    def append(self, item):
+        return self.put(item['id'], item['name'], item['quantity'], item['price'])
+
+    def remove(self, item_id):
+        row = self.index.by_id[item_id]
+        self.index.remove(item_id)
+        self.ids[row] = DELETED
+        if self._low_stock is not None:
+            self._low_stock.remove(item_id)
+        if self._totals is not None:
+            self._totals.remove(item_id, self.quantities[row], self.prices[row])
+        if self._id_allocator is not None:
+            self._id_allocator.removed(item_id)
+        self.deleted += 1
+        self.dirty.add(item_id)
+        if self.changed is not None:
+            self.changed.add(item_id)
+        self.version += 1
+        self.garbage += self.name_len[row]
+        if self.deleted > len(self) or self.garbage > len(self.names) // 2:
+            self.compact()
+
+    # Items whose name contains search_term (case-insensitive), ordered by ID
+    def search(self, search_term):
+        term = search_term.lower()
+        by_id = self.index.by_id
+        return [ItemRow(self, i) for i in sorted(self.index.candidates(term))
+                if term in self.name_at(by_id[i]).lower()]
+
+    # Up to k items ranked by how close their name is to search_term (see InventoryIndex.rank)
+    def fuzzy_search(self, search_term, k=10):
+        return [ItemRow(self, item_id) for _, item_id in self.index.rank(search_term, k)]
+
+    # Take over the contents of another Inventory (after reloading from disk);
+    # ItemRows handed out earlier keep working since they look items up by ID
+    def replace_with(self, other):
+        self.__dict__.update(other.__dict__)
+        if self._index is not None:
+            self._index.inventory = self
+
+    # Changes not saved yet: {id: (name, quantity, price), or None if deleted}
+    def unsaved_changes(self):
+        return {item_id: (self.get_field(item_id, 'name'), self.get_field(item_id, 'quantity'),
+                          self.get_field(item_id, 'price')) if item_id in self else None
+                for item_id in self.dirty}
+
+    # Put unsaved changes back after reloading from disk
+    def restore_unsaved_changes(self, changes):
+        for item_id, values in changes.items():
+            if values is None:
+                if item_id in self:
+                    self.remove(item_id)
+            else:
+                self.put(item_id, *values)
+            self.dirty.add(item_id)
+
+    # Drop deleted rows, unused name bytes and stale index postings
+    def compact(self):
+        live = list(self.rows())
+        dirty, changed = self.dirty, self.changed
+        self.__init__()
+        for item_id, name, quantity, price in live:
+            self.put(item_id, name, quantity, price)
+        self.dirty, self.changed = dirty, changed
+
+#END OF INVENTORY STORE SECTION-------------
+
+
+#STORAGE SECTION--------------
+# Every backend offers the same methods:
+#   load()                                  -> Inventory
+#   save_change(inventory, item, deleted)   one added/updated/deleted item
+#   save_changes(inventory, items)          many changed items, written together
+#   save_all(inventory)                     the whole inventory in one write
+#   find(search_term)                       matching items (without loading everything if possible)
+#   iter_rows()                             every (id, name, quantity, price), streamed if possible
+#   sync()                                  force changes written so far to disk
+#   close(inventory=None)                   flush and close (pass the inventory on exit from the menu)
+#   locked(inventory)                       context manager around a change: takes the write lock and
+#                                           first brings inventory up to date with other processes
+#   locked_if_current(inventory)            takes the write lock but leaves inventory alone, yields
+#                                           True if it is up to date (for work on another thread)
+#   compaction_due() / compact(inventory)   housekeeping that write-behind does on its own thread
+STORAGE_BACKEND = 'text'  # 'text' (inventory.txt + journal) or 'sqlite'
+storage = None
+
+# Exclusive lock on an open file (blocks until other processes release it)
+def lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue  # LK_LOCK gives up after 10 seconds, keep waiting
+
+def unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+# inventory.txt (or a binary snapshot) plus the append-only journal.
+# Several processes can share it: reads take no lock, and every change is made under
+# inventory.txt.lock after replaying what others appended to the journal (or reloading
+# everything if the generation counter shows inventory.txt was rewritten meanwhile)
+class TextFileStorage:
+    def __init__(self):
+        self.lock_depth = 0
+        self.defer_sync = False  # leave the fsync of journal records to sync() (write-behind)
+
+    def load(self):
+        return load_inventory()
+
+    @contextmanager
+    def file_lock(self):
+        with open(file_path + ".lock", 'a+') as lock:
+            lock_file(lock)
+            self.lock_depth = 1
+            try:
+                yield
+            finally:
+                self.lock_depth = 0
+                unlock_file(lock)
+
+    @contextmanager
+    def locked(self, inventory):
+        if self.lock_depth:
+            yield
+            return
+        with self.file_lock():
+            self.refresh(inventory)
+            yield
+
+    # Up to date = nothing unsaved, inventory.txt not rewritten and nothing appended to the log
+    # by another process since inventory last caught up
+    @contextmanager
+    def locked_if_current(self, inventory):
+        with self.file_lock():
+            log_size = os.path.getsize(get_journal_path()) if os.path.exists(get_journal_path()) else 0
+            yield (not inventory.dirty and read_generation() == journal['generation']
+                   and log_size == journal['offset'])
+
+    def refresh(self, inventory):
+        if read_generation() != journal['generation']:
+            close_journal()  # the old log is gone, reopen the new one on the next write
+            unsaved = inventory.unsaved_changes()
+            inventory.replace_with(load_inventory())
+            inventory.restore_unsaved_changes(unsaved)
+        elif os.path.exists(get_journal_path()) and os.path.getsize(get_journal_path()) > journal['offset']:
+            unsaved = inventory.unsaved_changes()
+            replay_journal(inventory, journal['offset'])
+            inventory.restore_unsaved_changes(unsaved)
+
+    def save_change(self, inventory, item, deleted=False):
+        self.save_changes(inventory, [item], deleted)
+
+    def save_changes(self, inventory, items, deleted=False):
+        items = [item for item in items if item['id'] in inventory.dirty]
+        if not items:
+            return  # nothing really changed
+        if not JOURNAL_MODE:
+            save_inventory(inventory)
+            return
+        try:
+            for item in items:
+                append_journal(item, deleted, sync=not self.defer_sync)
+        except Exception as e:
+            print(f"Error writing journal: {e}", file=sys.stderr)
+            save_inventory(inventory)
+            return
+        inventory.dirty.difference_update(item['id'] for item in items)
+        if self.compaction_due() and not self.defer_sync:  # else write-behind compacts in the background
+            compact_inventory(inventory)
+
+    def compaction_due(self):
+        return JOURNAL_MODE and journal['records'] >= JOURNAL_COMPACT_AFTER
+
+    # Only under locked_if_current(): inventory is exactly what is on disk, so it stays current.
+    # It is only read, except that a binary save squeezes out deleted rows, so that gets a copy
+    def compact(self, inventory):
+        if inventory.deleted and (SNAPSHOT_FORMAT or store_format()) == 'binary':
+            compact_inventory(copy_inventory(inventory))
+        else:
+            compact_inventory(inventory)
+
+    def sync(self):
+        sync_journal()
+
+    def save_all(self, inventory):
+        if JOURNAL_MODE and (journal['records'] or inventory.dirty):
+            compact_inventory(inventory)
+        elif inventory.dirty:
+            save_inventory(inventory)
+
+    def find(self, search_term):
+        return find_items(self.load(), search_term)
+
+    # Streams inventory.txt and lays the journal over it, so only the journal's records (at most
+    # JOURNAL_COMPACT_AFTER of them) are held in memory. A binary snapshot is loaded whole.
+    # inventory.txt is opened before the journal is read, and if another process rewrote it
+    # meanwhile (new generation) both are read again, so the two always match
+    def iter_rows(self):
+        for _ in range(3):
+            generation = read_generation()
+            try:
+                if is_binary_snapshot(file_path):
+                    break
+                f = open(file_path, 'r', encoding='utf-8', errors='replace')
+            except FileNotFoundError:
+                break
+            try:
+                changes = {}  # id -> (name, quantity, price), or None if deleted
+                if os.path.exists(get_journal_path()):
+                    for _, record in iter_journal(get_journal_path()):
+                        if record is not None:
+                            changes[record[0]] = record[1:] or None
+            except BaseException:
+                f.close()
+                raise
+            if read_generation() == generation:
+                return self.stream_rows(f, changes)
+            f.close()
+        return self.load().rows()
+
+    @staticmethod
+    def stream_rows(f, changes):
+        with f:
+            for item_id, name, qty, price in parse_inventory_lines(f):
+                if item_id not in changes:
+                    yield item_id, name, qty, price
+                    continue
+                values = changes.pop(item_id)
+                if values is not None:
+                    yield (item_id,) + values
+        for item_id, values in changes.items():
+            if values is not None:
+                yield (item_id,) + values
+
+    def close(self, inventory=None):
+        if inventory is not None and JOURNAL_MODE and (journal['records'] or inventory.dirty):
+            with self.locked(inventory):
+                compact_inventory(inventory)
+        else:
+            close_journal()
+
+# SQLite database (WAL mode, indexed on id and name); every change is a single-row write.
+# Name searches use items_fts, an FTS5 trigram index kept in step with items by triggers,
+# so a substring search of 3 or more characters does not scan the table (shorter ones do,
+# and so does every search if this SQLite has no FTS5).
+# SQLite does the locking; locked() reloads if another connection changed the data
+class SQLiteStorage:
+    def __init__(self, path):
+        self.path = path
+        self.lock_depth = 0
+        self.data_version = None
+        # used from the write-behind and server writer threads too, never at the same time
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS items ("
+                          "id INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+                          "quantity INTEGER NOT NULL, price REAL NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS items_name ON items (name COLLATE NOCASE)")
+        self.fts = self.create_name_index()
+        self.conn.commit()
+
+    def create_name_index(self):
+        if self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'items_fts'").fetchone():
+            return True
+        try:
+            self.conn.execute("CREATE VIRTUAL TABLE items_fts USING fts5("
+                              "name, content='items', content_rowid='id', tokenize='trigram')")
+        except sqlite3.OperationalError:
+            return False  # no FTS5 (or too old for trigrams), find() scans instead
+        self.conn.executescript("""
+            CREATE TRIGGER items_fts_insert AFTER INSERT ON items BEGIN
+                INSERT INTO items_fts (rowid, name) VALUES (new.id, new.name);
+            END;
+            CREATE TRIGGER items_fts_delete AFTER DELETE ON items BEGIN
+                INSERT INTO items_fts (items_fts, rowid, name) VALUES ('delete', old.id, old.name);
+            END;
+            CREATE TRIGGER items_fts_update AFTER UPDATE OF name ON items BEGIN
+                INSERT INTO items_fts (items_fts, rowid, name) VALUES ('delete', old.id, old.name);
+                INSERT INTO items_fts (rowid, name) VALUES (new.id, new.name);
+            END;
+            INSERT INTO items_fts (items_fts) VALUES ('rebuild');
+        """)
+        return True
+
+    def load(self):
+        inventory = Inventory()
+        self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        for item_id, name, qty, price in self.conn.execute("SELECT id, name, quantity, price FROM items ORDER BY id"):
+            inventory.put(item_id, name, qty, price)
+        inventory.dirty.clear()
+        return inventory
+
+    @contextmanager
+    def locked(self, inventory):
+        if self.lock_depth:
+            yield
+            return
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.lock_depth = 1
+        try:
+            if self.conn.execute("PRAGMA data_version").fetchone()[0] != self.data_version:
+                unsaved = inventory.unsaved_changes()
+                inventory.replace_with(self.load())
+                inventory.restore_unsaved_changes(unsaved)
+            yield
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        finally:
+            self.lock_depth = 0
+
+    @contextmanager
+    def locked_if_current(self, inventory):
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.lock_depth = 1
+        try:
+            yield (not inventory.dirty
+                   and self.conn.execute("PRAGMA data_version").fetchone()[0] == self.data_version)
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        finally:
+            self.lock_depth = 0
+
+    def compaction_due(self):
+        return False  # SQLite keeps its own files tidy
+
+    def compact(self, inventory):
+        pass
+
+    # Commit now unless we are inside locked(), which commits at the end
+    def write(self, sql, rows):
+        try:
+            self.conn.executemany(sql, rows)
+        except BaseException:
+            if not self.lock_depth:
+                self.conn.rollback()
+            raise
+        if not self.lock_depth:
+            self.conn.commit()
+
+    def save_change(self, inventory, item, deleted=False):
+        self.save_changes(inventory, [item], deleted)
+
+    def save_changes(self, inventory, items, deleted=False):
+        items = [item for item in items if item['id'] in inventory.dirty]
+        if not items:
+            return
+        if deleted:
+            self.write("DELETE FROM items WHERE id = ?", ((item['id'],) for item in items))
+        else:
+            # an upsert (not INSERT OR REPLACE, whose delete skips the triggers) keeps items_fts in step
+            self.write("INSERT INTO items (id, name, quantity, price) VALUES (?, ?, ?, ?) "
+                       "ON CONFLICT (id) DO UPDATE SET name = excluded.name, "
+                       "quantity = excluded.quantity, price = excluded.price",
+                       ((item['id'], item['name'], item['quantity'], item['price']) for item in items))
+        inventory.dirty.difference_update(item['id'] for item in items)
+
+    # In WAL mode with synchronous=NORMAL a commit does not wait for the disk, a checkpoint does
+    def sync(self):
+        self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def save_all(self, inventory):
+        if not inventory.dirty:
+            return
+        self.conn.execute("DELETE FROM items")
+        self.write("INSERT INTO items (id, name, quantity, price) VALUES (?, ?, ?, ?)", inventory.rows())
+        inventory.dirty.clear()
+
+    def find(self, search_term):
+        try:
+            rows = self.conn.execute("SELECT id, name, quantity, price FROM items WHERE id = ?", (int(search_term),))
+        except ValueError:
+            if self.fts and len(search_term) >= 3:
+                phrase = '"' + search_term.replace('"', '""') + '"'  # matched as one substring
+                rows = self.conn.execute("SELECT id, name, quantity, price FROM items WHERE id IN "
+                                         "(SELECT rowid FROM items_fts WHERE items_fts MATCH ?) ORDER BY id",
+                                         (phrase,))
+                return [dict(zip(ItemRow.FIELDS, row)) for row in rows]
+            pattern = "%" + search_term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            rows = self.conn.execute("SELECT id, name, quantity, price FROM items "
+                                     "WHERE name LIKE ? ESCAPE '\\' ORDER BY id", (pattern,))
+        return [dict(zip(ItemRow.FIELDS, row)) for row in rows]
+
+    # The cursor hands out rows as they are read, so the table is never all in memory
+    def iter_rows(self):
+        return self.conn.execute("SELECT id, name, quantity, price FROM items ORDER BY id")
+
+    def close(self, inventory=None):
+        self.conn.close()
+
+# Write-behind: changes are still written under the write lock (so other processes see them
+# before the lock is released and no update is lost), but without waiting for the disk;
+# a background thread forces them to disk every WRITE_BEHIND_INTERVAL seconds or after
+# WRITE_BEHIND_MAX_OPS changes, whichever comes first. The same thread folds the journal
+# into inventory.txt and takes the hourly snapshot, so neither holds up the menu; it only
+# does so while no other process has changed the store since the inventory caught up,
+# since it must not change the inventory the menu is reading (else it tries again later).
+# close() (called when main() exits, also on Ctrl+C and SIGTERM) syncs whatever is left.
+# Turn it on with IMS_WRITE_BEHIND=1
+WRITE_BEHIND = os.environ.get('IMS_WRITE_BEHIND', '') not in ('', '0')
+WRITE_BEHIND_INTERVAL = 2.0
+WRITE_BEHIND_MAX_OPS = 200
+
+class WriteBehindStorage:
+    def __init__(self, backend):
+        self.backend = backend
+        self.backend.defer_sync = True
+        self.mutex = threading.RLock()  # held while the inventory is changed or synced
+        self.wake = threading.Event()
+        self.stopping = False
+        self.ops = 0
+        self.inventory = None
+        self.thread = None
+
+    def load(self):
+        self.inventory = self.backend.load()
+        self.thread = threading.Thread(target=self.run, name="inventory-writer", daemon=True)
+        self.thread.start()
+        return self.inventory
+
+    def run(self):
+        while not self.stopping:
+            self.wake.wait(WRITE_BEHIND_INTERVAL)
+            self.wake.clear()
+            try:
+                self.flush()
+                self.housekeeping()
+            except Exception as e:
+                print(f"Error saving inventory in the background: {e}", file=sys.stderr)
+
+    # Force the changes written so far to disk now
+    def flush(self):
+        with self.mutex:
+            if self.ops:
+                self.backend.sync()
+                self.ops = 0
+
+    # Compact the journal and take the periodic snapshot when they are due
+    def housekeeping(self):
+        compact, snapshot = self.backend.compaction_due(), snapshot_due()
+        if not (compact or snapshot):
+            return
+        inventory = self.inventory
+        with self.mutex:
+            with self.backend.locked_if_current(inventory) as current:
+                if not current:
+                    return
+                if snapshot:
+                    write_snapshot(inventory, 'auto')
+                if compact:
+                    self.backend.compact(inventory)
+
+    @contextmanager
+    def locked(self, inventory):
+        with self.mutex:
+            with self.backend.locked(inventory):
+                yield
+
+    def save_change(self, inventory, item, deleted=False):
+        self.save_changes(inventory, [item], deleted)
+
+    def save_changes(self, inventory, items, deleted=False):
+        with self.mutex:
+            self.backend.save_changes(inventory, items, deleted)
+            self.ops += len(items)
+        if self.ops >= WRITE_BEHIND_MAX_OPS:
+            self.wake.set()
+
+    def save_all(self, inventory):
+        with self.mutex:
+            self.backend.save_all(inventory)
+            self.ops = 0
+
+    def sync(self):
+        self.wake.set()  # the background thread syncs, the caller does not wait for the disk
+
+    def find(self, search_term):
+        return self.backend.find(search_term)
+
+    def iter_rows(self):
+        return self.backend.iter_rows()
+
+    def close(self, inventory=None):
+        self.stopping = True
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+        self.backend.close(inventory)
+
+def open_storage(backend=None, path=None, write_behind=None):
+    backend = backend or STORAGE_BACKEND
+    if backend == 'sqlite':
+        opened = SQLiteStorage(path or os.path.splitext(file_path)[0] + ".db")
+    elif backend == 'text':
+        opened = TextFileStorage()
+    else:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    if WRITE_BEHIND if write_behind is None else write_behind:
+        return WriteBehindStorage(opened)
+    return opened
+
+def get_storage():
+    global storage
+    if storage is None:
+        storage = open_storage()
+    return storage
+
+# Where the side files (thresholds, ledger, snapshots, ID high-water mark) go: next to the
+# store in use, as inventory.txt.<ext> for the text backend or inventory.<ext> for inventory.db
+def get_side_file_base():
+    backend = getattr(storage, 'backend', storage)
+    if isinstance(backend, SQLiteStorage):
+        return os.path.splitext(backend.path)[0]
+    return file_path
+
+# Make a change to the inventory without losing other processes' changes:
+#   with write_lock(inventory):
+#       ...change items, then save_change()...
+def write_lock(inventory):
+    return get_storage().locked(inventory)
+
+# Persist a single add/update/delete (called by the menu functions)
+def save_change(inventory, item, deleted=False):
+    log_row_changes(inventory, [item['id']])
+    get_storage().save_change(inventory, item, deleted)
+
+# Persist a group of changed items; in journal mode they are appended and synced once
+def save_changes(inventory, items):
+    items = list(items)
+    log_row_changes(inventory, [item['id'] for item in items])
+    get_storage().save_changes(inventory, items)
+
+# Force changes that are written but maybe not on disk yet to disk (e.g. when going idle)
+def sync_storage():
+    get_storage().sync()
+
+# Persist many changes at once with a single write
+def save_all(inventory):
+    log_row_changes(inventory, inventory.dirty)
+    get_storage().save_all(inventory)
+
+#END OF STORAGE SECTION-------------
+
+
+#ID ALLOCATION SECTION--------------
+# New IDs come from IdAllocator instead of max() over every ID, so picking one takes the same
+# time for 10 or 10 million items. It keeps the high-water mark (the highest ID ever used):
+# it starts from the highest ID on disk and inventory.txt.ids (saved when the highest item
+# is deleted, so its ID is not handed out again), and Inventory moves it up on every add.
+# With REUSE_DELETED_IDS on, the IDs below the mark that are free (deleted, or never used)
+# are kept in a min-heap and handed out first, smallest first.
+# reserve() hands out a whole block of IDs at once for imports
+REUSE_DELETED_IDS = False
+ID_BLOCK_SIZE = 1000
+
+def get_high_water_path():
+    return get_side_file_base() + ".ids"
+
+def read_high_water():
+    try:
+        with open(get_high_water_path(), 'r') as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+def save_high_water(high_water):
+    write_atomically(get_high_water_path(), lambda f: f.write(str(high_water)))
+
+class IdAllocator:
+    def __init__(self, inventory, high_water=0):
+        self.inventory = inventory
+        self.high_water = max(high_water, max(inventory.ids, default=0))
+        self.free = []
+        if REUSE_DELETED_IDS:
+            used = bytearray(self.high_water + 1)
+            for item_id in inventory.ids:
+                if item_id != DELETED:
+                    used[item_id] = 1
+            self.free = [item_id for item_id in range(1, self.high_water + 1) if not used[item_id]]
+
+    # The ID the next new item gets (not taken yet)
+    def peek(self):
+        free = self.free
+        while free and free[0] in self.inventory:
+            heapq.heappop(free)  # taken since it was freed
+        return free[0] if free else self.high_water + 1
+
+    def added(self, item_id):
+        if item_id > self.high_water:
+            self.high_water = item_id
+
+    def removed(self, item_id):
+        if REUSE_DELETED_IDS:
+            heapq.heappush(self.free, item_id)
+
+    # A block of never-used IDs, e.g. for the rows of an import
+    def reserve(self, count=ID_BLOCK_SIZE):
+        start = self.high_water + 1
+        self.high_water += count
+        return range(start, start + count)
+
+    # Give back the unused end of a reserved block (if nothing was added after it)
+    def release(self, unused):
+        if unused and unused[-1] == self.high_water:
+            self.high_water = unused[0] - 1
+
+#END OF ID ALLOCATION SECTION-------------
+
 # Generate ID (unique to each other)
 def generate_new_id(inventory):
-    if not inventory:
-        return 1
-    max_id = max(item['id'] for item in inventory)
-    return max_id + 1
+    return inventory.id_allocator.peek()
+
+#CORE OPERATIONS SECTION--------------
+# The same operations as the menu, without any prompts (used by the menu and the command line).
+# Bad values and unknown IDs raise ValueError
+
+# First free ID from generate_new_id onwards
+def next_free_id(inventory):
+    new_id = generate_new_id(inventory)
+    while new_id in inventory:
+        new_id += 1
+    return new_id
+
+def create_item(inventory, name, quantity, price, item_id=None):
+    name = validate_name(name)
+    quantity = validate_input(str(quantity), int)
+    price = validate_input(str(price), float)
+    with write_lock(inventory):
+        if item_id is None:
+            item_id = next_free_id(inventory)
+        elif item_id in inventory:
+            raise ValueError(f"ID {item_id} already exists")
+        item = inventory.put(item_id, name, quantity, price)
+        save_change(inventory, item)
+        if quantity:
+            record_movements([(item_id, quantity, 'add')])
+    return item
+
+def get_item(inventory, item_id):
+    item = inventory.get(item_id)
+    if item is None:
+        raise ValueError(f"Item with ID {item_id} not found")
+    return item
+
+# Items matching an ID, or whose name contains the search term
+def find_items(inventory, search_term):
+    try:
+        search_id = int(search_term)
+        return [inventory.get(search_id)] if search_id in inventory else []
+    except ValueError:
+        return inventory.search(search_term)
+
+def modify_item(inventory, item_id, name=None, quantity=None, price=None):
+    if name is not None:
+        name = validate_name(name)
+    if quantity is not None:
+        quantity = validate_input(str(quantity), int)
+    if price is not None:
+        price = validate_input(str(price), float)
+    with write_lock(inventory):
+        item = get_item(inventory, item_id)
+        was_low = inventory.low_stock.is_low(item_id)
+        old_quantity = item['quantity']
+        if name is not None:
+            item['name'] = name
+        if quantity is not None:
+            item['quantity'] = quantity
+        if price is not None:
+            item['price'] = price
+        save_change(inventory, item)
+        if item['quantity'] != old_quantity:
+            record_movements([(item_id, item['quantity'] - old_quantity, 'update')])
+    check_low_stock(inventory, item, was_low)
+    return item
+
+# Returns the deleted item's details as a plain dict
+def remove_item(inventory, item_id):
+    with write_lock(inventory):
+        item = get_item(inventory, item_id).to_dict()
+        inventory.remove(item_id)
+        save_change(inventory, item, deleted=True)
+        if item_id >= inventory.id_allocator.high_water:
+            save_high_water(item_id)  # so the ID is not given to a new item after a restart
+        if item['quantity']:
+            record_movements([(item_id, -item['quantity'], 'delete')])
+    return item
+
+# Add (+) or subtract (-) stock, returns the new quantity
+def change_stock(inventory, item_id, change, reason='adjust'):
+    with write_lock(inventory):
+        item = get_item(inventory, item_id)
+        new_quantity = item['quantity'] + change
+        if new_quantity < 0:
+            raise ValueError("Resulting quantity cannot be negative")
+        was_low = inventory.low_stock.is_low(item_id)
+        item['quantity'] = new_quantity
+        save_change(inventory, item)
+        if change:
+            record_movements([(item_id, change, reason)])
+    check_low_stock(inventory, item, was_low)
+    return new_quantity
+
+#END OF CORE OPERATIONS SECTION-------------
 
 # Welcome Screen (open just once when opening the IMS.py)
 def display_welcome():
@@ -78,8 +1554,43 @@ def display_main_menu():
     print("5. Delete Item")
     print("6. Adjust Stock (+/-)")
     print("7. Credits")
+    print("8. Import Items from File")
+    print("9. Bulk Adjust Stock from File")
+    print("10. Low Stock Report")
+    print("11. Inventory Value Report")
+    print("12. Stock Movement History")
+    print("13. Snapshots and Restore")
     print("0. Exit")
 
+# Check one value (same rules for typed input and imported files), raises ValueError
+def validate_input(user_input, input_type=str):
+    if input_type == str:
+        if not user_input:
+            raise ValueError("Input cannot be empty")
+        return user_input
+    elif input_type == int:
+        value = int(user_input)
+        if value < 0:
+            raise ValueError("Value must be positive")
+        if value > MAX_INT:
+            raise ValueError(f"Value must be at most {MAX_INT}")
+        return value
+    elif input_type == float:
+        value = float(user_input)
+        if value < 0:
+            raise ValueError("Value must be positive")
+        return value
+
+# Item names are stored as a field of a comma separated line, so they cannot contain commas
+# or line breaks (or any other control character)
+def validate_name(name):
+    name = validate_input(name.strip(), str)
+    if ',' in name:
+        raise ValueError("Name cannot contain commas")
+    if not name.isprintable():
+        raise ValueError("Name cannot contain line breaks or other control characters")
+    return name
+
 # Only get valid input from users (to avoid errors) with option to go back (press '0') (Back button in console)
 def get_valid_input(prompt, input_type=str, allow_back=True):
     while True:
@@ -87,20 +1598,7 @@ def get_valid_input(prompt, input_type=str, allow_back=True):
         if allow_back and user_input == '0':
             return None
         try:
-            if input_type == str:
-                if not user_input:
-                    raise ValueError("Input cannot be empty")
-                return user_input
-            elif input_type == int:
-                value = int(user_input)
-                if value < 0:
-                    raise ValueError("Value must be positive")
-                return value
-            elif input_type == float:
-                value = float(user_input)
-                if value < 0:
-                    raise ValueError("Value must be positive")
-                return value
+            return validate_input(user_input, input_type)
         except ValueError as e:
             print(f"Invalid input: {e}. Please try again.")
 
@@ -117,15 +1615,13 @@ def add_item(inventory):
     if id_choice is None or id_choice == 0:
         return
     if id_choice == 1:
-        new_id = generate_new_id(inventory) #Check if already ID exist, if not increment to 1
-        while any(item['id'] == new_id for item in inventory):
-            new_id += 1
-        print(f"\nAuto-generated ID: {new_id}")
+        new_id = None  # picked when saving, in case another terminal takes the next ID first
+        print(f"\nAuto-generated ID: {next_free_id(inventory)}")
     elif id_choice == 2:
         new_id = get_valid_input("Enter ID: ", int)
         if new_id is None:
             return
-        if any(item['id'] == new_id for item in inventory):
+        if new_id in inventory:
             print(f"ID {new_id} already exists. Please choose another.")
             input("\nPress Enter to continue...")
             return
@@ -146,30 +1642,72 @@ def add_item(inventory):
     if price is None:
         return
 
-    inventory.append({
-        'id': new_id,
-        'name': name,
-        'quantity': quantity,
-        'price': price
-    })
-
-    save_inventory(inventory)
-    print(f"\nSuccess! Item '{name}' (ID: {new_id}) added.")
+    try:
+        item = create_item(inventory, name, quantity, price, new_id)
+    except ValueError as e:
+        print(f"\nError: {e}")
+        input("\nPress Enter to continue...")
+        return
+    print(f"\nSuccess! Item '{name}' (ID: {item['id']}) added.")
     input("\nPress Enter to continue...")
 
-# Display all items in inventory.txt
+# One line of the item tables
+def format_item_row(item_id, name, qty, price):
+    return f"{item_id:<5} {name[:18]:<18} {qty:>5}   ₱{price:>7.2f}"
+
+ITEM_TABLE_HEADER = "ID    Name                 Qty    Price\n--------------------------------------"
+PAGE_SIZE = 20
+SORT_FIELDS = ('id', 'name', 'quantity', 'price')
+
+# Write the given rows as one table, a chunk of lines per write() instead of a print() per row
+def write_item_rows(inventory, rows, out=None, chunk_size=1000):
+    out = out or sys.stdout
+    out.write(ITEM_TABLE_HEADER + "\n")
+    for start in range(0, len(rows), chunk_size):
+        out.write("\n".join(format_item_row(*inventory.row_values(row))
+                            for row in rows[start:start + chunk_size]) + "\n")
+
+# Display all items in inventory.txt, a page at a time
 def view_all_items(inventory):
-    print("CURRENT INVENTORY")
-    print("----------------")
+    page, sort_by, reverse, below = 1, 'id', False, None
+    while True:
+        print("CURRENT INVENTORY")
+        print("----------------")
 
-    if not inventory:
-        print("\nNo items in inventory")
-    else:
-        print("\nID    Name                 Qty    Price")
-        print("--------------------------------------")
-        for item in inventory:
-            print(f"{item['id']:<5} {item['name'][:18]:<18} {item['quantity']:>5}   ₱{item['price']:>7.2f}")
-    input("\nPress Enter to return to menu...")
+        rows = inventory.sorted_rows(sort_by, reverse, below)
+        if not rows:
+            print("\nNo items in inventory" if below is None else f"\nNo items with quantity below {below}")
+        else:
+            pages = (len(rows) + PAGE_SIZE - 1) // PAGE_SIZE
+            page = min(max(page, 1), pages)
+            print()
+            write_item_rows(inventory, rows[(page - 1) * PAGE_SIZE:page * PAGE_SIZE])
+            details = f"sorted by {sort_by}{' (descending)' if reverse else ''}"
+            if below is not None:
+                details += f", quantity below {below}"
+            print(f"\nPage {page} of {pages} - {len(rows)} item(s), {details}")
+        print("\nN = Next page, P = Previous page, G = Go to page, S = Sort, F = Filter by low quantity")
+        choice = input("Press Enter to return to menu, or choose an option: ").strip().lower()
+        if choice in ('', '0'):
+            return
+        elif choice == 'n':
+            page += 1
+        elif choice == 'p':
+            page -= 1
+        elif choice == 'g':
+            new_page = get_valid_input("Go to page: ", int)
+            if new_page is not None:
+                page = new_page
+        elif choice == 's':
+            field = get_valid_input("Sort by 1. ID  2. Name  3. Quantity  4. Price (again to reverse): ", int)
+            if field is not None and 1 <= field <= len(SORT_FIELDS):
+                reverse = not reverse if SORT_FIELDS[field - 1] == sort_by else False
+                sort_by = SORT_FIELDS[field - 1]
+                page = 1
+        elif choice == 'f':
+            threshold = get_valid_input("Show items with quantity below (press '0' to clear the filter): ", int)
+            below = threshold or None
+            page = 1
 
 # Search for item by name or ID
 def search_item(inventory):
@@ -179,16 +1717,14 @@ def search_item(inventory):
     search_term = get_valid_input("\nEnter ID or Name to search (press '0' to cancel): ", str)
     if search_term is None:
         return
-    results = []
-    try:
-        search_id = int(search_term)
-        results = [item for item in inventory if item['id'] == search_id]
-    except ValueError:
-        # Search by name if ID not found
-        results = [item for item in inventory if search_term.lower() in item['name'].lower()]
+    results = find_items(inventory, search_term)
     print("SEARCH RESULTS")
     print("-------------")
 
+    if not results and not search_term.isdigit():
+        results = inventory.fuzzy_search(search_term)
+        if results:
+            print("\nNo exact matches. Closest items:")
     if not results:
         print("\nNo matching items found")
     else:
@@ -205,17 +1741,22 @@ def find_item_by_id_or_name(inventory, prompt):
         return None
     try:
         search_id = int(search_term)
-        item = next((i for i in inventory if i['id'] == search_id), None)
+        item = inventory.get(search_id)
         if item:
             return item
     except ValueError:
         pass
     # Search by name if ID not found
-    matches = [i for i in inventory if search_term.lower() in i['name'].lower()]
+    matches = inventory.search(search_term)
     if len(matches) == 1:
         return matches[0]
-    elif len(matches) > 1:
+    if not matches:
+        matches = inventory.fuzzy_search(search_term, 5)
+        if matches:
+            print("\nNo exact match. Did you mean:")
+    else:
         print("\nMultiple matching items found:")
+    if matches:
         for i, match in enumerate(matches, 1):
             print(f"{i}. {match['name']} (ID: {match['id']})")
         choice = get_valid_input("\nEnter number to select (press '0' to cancel): ", int)
@@ -244,22 +1785,30 @@ def update_item(inventory):
         return
     if field == 1:
         new_name = get_valid_input(f"Enter new name (current: {item['name']}): ", str)
-        if new_name is not None:
-            item['name'] = new_name
+        if new_name is None:
+            return
+        changes = {'name': new_name}
     elif field == 2:
         new_quantity = get_valid_input(f"Enter new quantity (current: {item['quantity']}): ", int)
-        if new_quantity is not None:
-            item['quantity'] = new_quantity
+        if new_quantity is None:
+            return
+        changes = {'quantity': new_quantity}
     elif field == 3:
         new_price = get_valid_input(f"Enter new price (current: ₱{item['price']:.2f}): ₱", float)
-        if new_price is not None:
-            item['price'] = new_price
+        if new_price is None:
+            return
+        changes = {'price': new_price}
     else:
         print("Invalid field selection.")
         input("\nPress Enter to continue...")
         return
 
-    save_inventory(inventory)
+    try:
+        modify_item(inventory, item['id'], **changes)
+    except ValueError as e:  # e.g. deleted from another terminal meanwhile
+        print(f"\nError: {e}")
+        input("\nPress Enter to continue...")
+        return
     print("\nItem updated successfully!")
     input("\nPress Enter to continue...")
 
@@ -274,9 +1823,11 @@ def delete_item(inventory):
         return
     confirm = input(f"\nAre you sure you want to delete '{item['name']}' (ID: {item['id']})? (Y/N): ").strip().lower()
     if confirm == 'y':
-        inventory[:] = [i for i in inventory if i['id'] != item['id']]
-        save_inventory(inventory)
-        print("\nItem deleted successfully!")
+        try:
+            remove_item(inventory, item['id'])
+            print("\nItem deleted successfully!")
+        except ValueError as e:
+            print(f"\nError: {e}")
     else:
         print("\nDeletion cancelled.")
     input("\nPress Enter to continue...")
@@ -295,22 +1846,981 @@ def adjust_stock(inventory):
         return
     try:
         # if '+' add... if '-' subtract stock
-        if adjustment.startswith(('+', '-')):
-            change = int(adjustment)
-            new_quantity = item['quantity'] + change
-            if new_quantity < 0:
-                print("Error: Resulting quantity cannot be negative.")
-                input("\nPress Enter to continue...")
-                return
-            item['quantity'] = new_quantity
-            save_inventory(inventory)
-            print(f"\nStock updated. New quantity: {new_quantity}")
-        else:
+        if not adjustment.startswith(('+', '-')):
             print("Invalid input. Please use + or - before the number.")
+            input("\nPress Enter to continue...")
+            return
+        change = int(adjustment)
     except ValueError:
         print("Invalid input. Please enter a valid number after + or -.")
+        input("\nPress Enter to continue...")
+        return
+    reason = input("Reason (e.g. sale, restock, damaged; press Enter to skip): ").strip() or 'adjust'
+    try:
+        new_quantity = change_stock(inventory, item['id'], change, reason)
+        print(f"\nStock updated. New quantity: {new_quantity}")
+    except ValueError as e:
+        print(f"Error: {e}.")
+    input("\nPress Enter to continue...")
+
+#IMPORT SECTION--------------
+# Read rows from a CSV, JSONL or columnar (.imsc) file as dicts with id/name/quantity/price keys.
+# CSV files may have a header row; without one the columns are id,name,quantity,price
+# (or name,quantity,price to auto-generate the IDs). Columnar rows are numbered from 1
+def read_import_rows(path):
+    if export_format_for(path) == 'columnar':
+        try:
+            for row_no, (item_id, name, quantity, price) in enumerate(read_columnar_export(path), 1):
+                yield row_no, {'id': item_id, 'name': name, 'quantity': quantity, 'price': price}
+        except (struct.error, EOFError) as e:  # cut off in a header or in the gzip stream
+            raise ValueError(f"columnar export is truncated ({e})")
+        return
+    if path.lower().endswith(('.jsonl', '.json')):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        row = json.loads(line)
+                    except ValueError as e:
+                        row = {'error': f"invalid JSON ({e})"}
+                    if not isinstance(row, dict):
+                        row = {'error': "expected a JSON object"}
+                    yield line_no, row
+        return
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        columns = None
+        rows = iter(reader)
+        while True:
+            try:
+                row = next(rows)
+            except StopIteration:
+                return
+            except csv.Error as e:  # e.g. a NUL byte; the file can't be read any further
+                raise ValueError(f"line {reader.line_num}: {e}")
+            if not any(cell.strip() for cell in row):
+                continue
+            if columns is None:
+                header = [cell.strip().lower() for cell in row]
+                if 'name' in header:
+                    columns = header
+                    continue
+                columns = ['id', 'name', 'quantity', 'price'] if len(row) >= 4 else ['name', 'quantity', 'price']
+            yield reader.line_num, dict(zip(columns, (cell.strip() for cell in row)))
+
+# Check one imported row with the same rules as get_valid_input, returns (id or None, name, qty, price)
+def validate_import_row(row):
+    if 'error' in row:
+        raise ValueError(row['error'])
+    item_id = str(row.get('id') if row.get('id') is not None else '').strip()
+    name = validate_name(str(row.get('name') or ''))
+    quantity = validate_input(str(row.get('quantity', '')).strip(), int)
+    price = validate_input(str(row.get('price', '')).strip(), float)
+    return (validate_input(item_id, int) if item_id else None), name, quantity, price
+
+# Add every valid row of a CSV/JSONL file, then save once.
+# Rows without an ID get a generated one; rows whose ID already exists are rejected
+# like in add_item. Returns (number added, [(line number, reason), ...])
+# If the file can't be read to the end (OSError, or ValueError e.g. for bytes that are
+# not UTF-8), the rows added so far are taken out again and nothing is saved
+def import_items(inventory, path):
+    added = 0
+    errors = []
+    movements = []
+    new_ids = []
+    with write_lock(inventory):
+        auto_snapshot(inventory, 'before import')
+        allocator = inventory.id_allocator
+        block = range(0)  # IDs reserved for rows without one
+        try:
+            for line_no, row in read_import_rows(path):
+                try:
+                    item_id, name, quantity, price = validate_import_row(row)
+                except ValueError as e:
+                    errors.append((line_no, str(e)))
+                    continue
+                if item_id is None:
+                    while item_id is None or item_id in inventory:  # a row with an ID may have taken it
+                        if not block:
+                            block = allocator.reserve(ID_BLOCK_SIZE)
+                        item_id, block = block[0], block[1:]
+                elif item_id in inventory:
+                    errors.append((line_no, f"ID {item_id} already exists"))
+                    continue
+                new_ids.append((item_id, item_id in inventory.dirty))
+                inventory.put(item_id, name, quantity, price)
+                if quantity:
+                    movements.append((item_id, quantity, 'import'))
+                added += 1
+        except BaseException:
+            for item_id, was_dirty in new_ids:
+                inventory.remove(item_id)
+                if not was_dirty:
+                    inventory.dirty.discard(item_id)
+            raise
+        finally:
+            allocator.release(block)
+        if added:
+            save_all(inventory)
+            record_movements(movements)
+    return added, errors
+
+def import_items_menu(inventory):
+    print("IMPORT ITEMS")
+    print("------------")
+
+    path = get_valid_input("\nEnter path of CSV, JSONL or .imsc file (press '0' to cancel): ", str)
+    if path is None:
+        return
+    try:
+        added, errors = import_items(inventory, path)
+    except (OSError, ValueError) as e:
+        print(f"\nError reading file, nothing was imported: {e}")
+        input("\nPress Enter to continue...")
+        return
+    print(f"\nImported {added} item(s).")
+    if errors:
+        print(f"Skipped {len(errors)} row(s):")
+        for line_no, reason in errors[:10]:
+            print(f"  line {line_no}: {reason}")
     input("\nPress Enter to continue...")
 
+#END OF IMPORT SECTION-------------
+
+
+#BULK ADJUST SECTION--------------
+# Read "id,+5" / "id,-3" lines (e.g. end-of-day POS sales), yields (line number, id, delta)
+# or (line number, None, reason) for lines that can't be read
+def parse_adjustment_lines(f):
+    for line_no, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        parts = line.split(",")
+        try:
+            if len(parts) != 2:
+                raise ValueError(f"expected id,adjustment, found {len(parts)} fields")
+            yield line_no, int(parts[0]), int(parts[1])
+        except ValueError as e:
+            yield line_no, None, str(e)
+
+def read_adjustment_rows(path):
+    with open(path, 'r') as f:
+        yield from parse_adjustment_lines(f)
+
+# Apply many (id, delta) adjustments in one pass and save once.
+# Only the adjustments that would make a quantity negative (or name an unknown ID)
+# are rejected. Returns (number applied, [(position, reason), ...])
+# If reading the adjustments fails partway, the quantities changed so far are put back
+# and nothing is saved
+def adjust_stock_bulk(inventory, adjustments, reason='bulk'):
+    applied = 0
+    rejected = []
+    changed = {}
+    original = {}  # id -> (quantity, already unsaved) before its first adjustment
+    was_low = {}
+    movements = []
+    with write_lock(inventory):
+        auto_snapshot(inventory, 'before bulk adjust')
+        low_stock = inventory.low_stock
+        try:
+            for position, item_id, delta in adjustments:
+                if item_id is None:
+                    rejected.append((position, delta))
+                    continue
+                item = changed.get(item_id) or inventory.get(item_id)
+                if item is None:
+                    rejected.append((position, f"ID {item_id} not found"))
+                    continue
+                new_quantity = item['quantity'] + delta
+                if new_quantity < 0:
+                    rejected.append((position, f"quantity of ID {item_id} would become {new_quantity}"))
+                    continue
+                if item_id not in changed:
+                    was_low[item_id] = low_stock.is_low(item_id)
+                    original[item_id] = (item['quantity'], item_id in inventory.dirty)
+                item['quantity'] = new_quantity
+                changed[item_id] = item
+                if delta:
+                    movements.append((item_id, delta, reason))
+                applied += 1
+        except BaseException:
+            for item_id, (quantity, was_dirty) in original.items():
+                inventory.set_field(item_id, 'quantity', quantity)
+                if not was_dirty:
+                    inventory.dirty.discard(item_id)
+            raise
+        if changed:
+            save_changes(inventory, changed.values())
+            record_movements(movements)
+    for item_id, item in changed.items():
+        check_low_stock(inventory, item, was_low[item_id])
+    return applied, rejected
+
+def bulk_adjust_stock_menu(inventory):
+    print("BULK ADJUST STOCK")
+    print("-----------------")
+
+    path = get_valid_input("\nEnter path of adjustment file, one 'id,+/-qty' per line (press '0' to cancel): ", str)
+    if path is None:
+        return
+    try:
+        applied, rejected = adjust_stock_bulk(inventory, read_adjustment_rows(path))
+    except (OSError, ValueError) as e:
+        print(f"\nError reading file, nothing was changed: {e}")
+        input("\nPress Enter to continue...")
+        return
+    print(f"\nApplied {applied} adjustment(s).")
+    if rejected:
+        print(f"Rejected {len(rejected)} line(s):")
+        for line_no, reason in rejected[:10]:
+            print(f"  line {line_no}: {reason}")
+    input("\nPress Enter to continue...")
+
+#END OF BULK ADJUST SECTION-------------
+
+
+#LOW STOCK SECTION--------------
+# An item is low on stock when its quantity is below its threshold (MIN_STOCK_ALERT unless
+# it has its own, kept in inventory.txt.thresholds as 'id,threshold' lines).
+# LowStockIndex keeps a min-heap of (quantity - threshold, id) that is updated on every
+# quantity change, so the low items are the top of the heap and can be listed without
+# looking at the rest of the inventory. Old heap entries are left in place and skipped
+# (their margin no longer matches), and the heap is rebuilt once they pile up.
+MIN_STOCK_ALERT = 10
+
+def get_thresholds_path():
+    return get_side_file_base() + ".thresholds"
+
+def get_thresholds_mtime():
+    try:
+        return os.stat(get_thresholds_path()).st_mtime_ns
+    except OSError:
+        return None
+
+# {id: threshold} for the items with their own threshold
+def load_thresholds():
+    thresholds = {}
+    try:
+        with open(get_thresholds_path(), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    item_id, threshold = line.split(',')
+                    thresholds[int(item_id)] = int(threshold)
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return thresholds
+
+def save_thresholds(thresholds):
+    write_atomically(get_thresholds_path(), lambda f: f.writelines(
+        f"{item_id},{threshold}\n" for item_id, threshold in sorted(thresholds.items())))
+
+class LowStockIndex:
+    def __init__(self, inventory, thresholds, mtime=None):
+        self.thresholds = thresholds
+        self.mtime = mtime
+        self.margins = {item_id: quantity - thresholds.get(item_id, MIN_STOCK_ALERT)
+                        for item_id, _, quantity, _ in inventory.rows()}
+        self.rebuild()
+
+    def rebuild(self):
+        self.heap = [(margin, item_id) for item_id, margin in self.margins.items()]
+        heapq.heapify(self.heap)
+
+    def threshold(self, item_id):
+        return self.thresholds.get(item_id, MIN_STOCK_ALERT)
+
+    def update(self, item_id, quantity):
+        margin = quantity - self.threshold(item_id)
+        if self.margins.get(item_id) == margin:
+            return
+        self.margins[item_id] = margin
+        heapq.heappush(self.heap, (margin, item_id))
+        if len(self.heap) > 2 * len(self.margins) + 64:
+            self.rebuild()
+
+    def remove(self, item_id):
+        self.margins.pop(item_id, None)
+
+    def is_low(self, item_id):
+        margin = self.margins.get(item_id)
+        return margin is not None and margin < 0
+
+    # IDs below their threshold, furthest below first. Walks only the heap entries with
+    # a negative margin (their parents are always smaller), not the whole heap
+    def below(self):
+        heap, margins = self.heap, self.margins
+        found = set()
+        pending = [0]
+        while pending:
+            position = pending.pop()
+            if position >= len(heap) or heap[position][0] >= 0:
+                continue
+            margin, item_id = heap[position]
+            if margins.get(item_id) == margin:
+                found.add((margin, item_id))
+            pending += (2 * position + 1, 2 * position + 2)
+        return [item_id for _, item_id in sorted(found)]
+
+# Called with (item, threshold) when a change takes an item below its threshold
+low_stock_hooks = []
+
+def warn_low_stock(item, threshold):
+    print(f"\n*** LOW STOCK: '{item['name']}' (ID: {item['id']}) is down to {item['quantity']}"
+          f" (alert below {threshold}) ***", file=sys.stderr)
+
+low_stock_hooks.append(warn_low_stock)
+
+# Run the hooks if item was not low before the change but is now
+def check_low_stock(inventory, item, was_low):
+    low_stock = inventory.low_stock
+    if was_low or not low_stock.is_low(item['id']):
+        return
+    for hook in low_stock_hooks:
+        hook(item, low_stock.threshold(item['id']))
+
+# Low items as (item, threshold), furthest below their threshold first
+def low_stock_items(inventory):
+    low_stock = inventory.low_stock
+    return [(inventory.get(item_id), low_stock.threshold(item_id)) for item_id in low_stock.below()]
+
+# Give an item its own threshold, or back to MIN_STOCK_ALERT with threshold=None
+def set_stock_threshold(inventory, item_id, threshold=None):
+    if threshold is not None:
+        threshold = validate_input(str(threshold), int)
+    with write_lock(inventory):
+        get_item(inventory, item_id)
+        thresholds = load_thresholds()
+        if threshold is None:
+            thresholds.pop(item_id, None)
+        else:
+            thresholds[item_id] = threshold
+        save_thresholds({i: t for i, t in thresholds.items() if i in inventory})
+        inventory._low_stock = None  # pick up the new thresholds
+    return inventory.low_stock.threshold(item_id)
+
+def low_stock_menu(inventory):
+    while True:
+        print("LOW STOCK REPORT")
+        print("----------------")
+
+        low = low_stock_items(inventory)
+        if not low:
+            print(f"\nNo items below their alert level (default: below {MIN_STOCK_ALERT})")
+        else:
+            lines = ["", "ID    Name                 Qty    Price   Alert below",
+                     "-----------------------------------------------------"]
+            lines += [f"{format_item_row(*item.to_dict().values())}   {threshold:>5}" for item, threshold in low]
+            sys.stdout.write("\n".join(lines) + "\n")
+            print(f"\n{len(low)} item(s) to reorder")
+
+        choice = input("\nPress Enter to return to menu, or T to set an item's alert level: ").strip().lower()
+        if choice != 't':
+            return
+        item = find_item_by_id_or_name(inventory, "\nEnter ID or Name (press '0' to cancel): ")
+        if not item:
+            continue
+        threshold = get_valid_input(f"Alert when '{item['name']}' is below (press '0' to use the default {MIN_STOCK_ALERT}): ", int)
+        try:
+            set_stock_threshold(inventory, item['id'], threshold)
+        except ValueError as e:
+            print(f"\nError: {e}")
+            input("\nPress Enter to continue...")
+
+#END OF LOW STOCK SECTION-------------
+
+
+#REPORT SECTION--------------
+# InventoryTotals keeps the running totals (items, stock, stock value, items per price band)
+# and is updated by Inventory on every add/update/delete, so reading them costs nothing.
+# A max-heap of (-quantity*price, id) gives the most valuable items the same way
+# LowStockIndex gives the low ones: old entries are skipped and rebuilt away.
+PRICE_BANDS = (50, 100, 500, 1000)  # band limits in pesos: under ₱50, ₱50-99.99, ...
+
+class InventoryTotals:
+    def __init__(self, inventory):
+        self.count = 0
+        self.quantity = 0
+        self.value = 0.0
+        self.price_sum = 0.0
+        self.bands = [0] * (len(PRICE_BANDS) + 1)
+        self.values = {}  # id -> quantity * price
+        self.heap = []
+        for item_id, _, quantity, price in inventory.rows():
+            self.add(item_id, quantity, price)
+
+    def rebuild(self):
+        self.heap = [(-value, item_id) for item_id, value in self.values.items()]
+        heapq.heapify(self.heap)
+
+    def add(self, item_id, quantity, price):
+        value = quantity * price
+        self.count += 1
+        self.quantity += quantity
+        self.value += value
+        self.price_sum += price
+        self.bands[bisect.bisect_right(PRICE_BANDS, price)] += 1
+        self.values[item_id] = value
+        heapq.heappush(self.heap, (-value, item_id))
+        if len(self.heap) > 2 * len(self.values) + 64:
+            self.rebuild()
+
+    def remove(self, item_id, quantity, price):
+        self.count -= 1
+        self.quantity -= quantity
+        self.value -= quantity * price
+        self.price_sum -= price
+        self.bands[bisect.bisect_right(PRICE_BANDS, price)] -= 1
+        del self.values[item_id]
+
+    # The n most valuable (id, value), walking the heap from the top instead of sorting everything
+    def top(self, n):
+        heap, values = self.heap, self.values
+        found = []
+        seen = set()
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier and len(found) < n:
+            (value, item_id), position = heapq.heappop(frontier)
+            if values.get(item_id) == -value and item_id not in seen:
+                seen.add(item_id)
+                found.append((item_id, -value))
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+        return found
+
+def price_band_labels():
+    limits = (0,) + PRICE_BANDS
+    labels = [f"₱{low}-{high - 0.01:.2f}" for low, high in zip(limits, PRICE_BANDS)]
+    return labels + [f"₱{PRICE_BANDS[-1]} and up"]
+
+def inventory_report(inventory, top=5):
+    totals = inventory.totals
+    return {
+        'items': totals.count,
+        'total_quantity': totals.quantity,
+        'total_value': round(totals.value, 2),
+        'average_price': round(totals.price_sum / totals.count, 2) if totals.count else 0.0,
+        'price_bands': dict(zip(price_band_labels(), totals.bands)),
+        'top_by_value': [dict(inventory.get(item_id), value=round(value, 2))
+                         for item_id, value in totals.top(top)],
+    }
+
+def format_report(report):
+    lines = [f"Items:           {report['items']}",
+             f"Total stock:     {report['total_quantity']}",
+             f"Total value:     ₱{report['total_value']:,.2f}",
+             f"Average price:   ₱{report['average_price']:,.2f}",
+             "", "Items per price band:"]
+    lines += [f"  {label:<18} {count:>6}" for label, count in report['price_bands'].items()]
+    if report['top_by_value']:
+        lines += ["", "Most valuable stock:", "ID    Name                 Qty    Price        Value",
+                  "-----------------------------------------------------"]
+        lines += [f"{format_item_row(item['id'], item['name'], item['quantity'], item['price'])}"
+                  f"   ₱{item['value']:>10,.2f}" for item in report['top_by_value']]
+    return "\n".join(lines)
+
+def report_menu(inventory):
+    print("INVENTORY REPORT")
+    print("----------------")
+    print("\n" + format_report(inventory_report(inventory)))
+    input("\nPress Enter to return to menu...")
+
+#END OF REPORT SECTION-------------
+
+
+#ANALYTICS SECTION--------------
+# Optional NumPy view of the inventory for questions over millions of rows (needs numpy).
+# Inventory already keeps the ids, quantities and prices in typed arrays, so each call wraps
+# those arrays as NumPy arrays without copying them (np.frombuffer): there is no second copy
+# to keep in sync, and every answer includes the latest changes. The wrapped arrays are
+# dropped before the call returns, since an array('q') can't grow while NumPy looks at it
+class InventoryAnalytics:
+    def __init__(self, inventory):
+        if np is None:
+            raise ValueError("Analytics need NumPy (pip install numpy)")
+        self.inventory = inventory
+
+    # (ids, quantities, prices) of the live items, as new NumPy arrays
+    def columns(self):
+        inventory = self.inventory
+        ids = np.frombuffer(inventory.ids, dtype=np.int64)
+        live = ids != DELETED
+        return (ids[live], np.frombuffer(inventory.quantities, dtype=np.int64)[live],
+                np.frombuffer(inventory.prices, dtype=np.float64)[live])
+
+    def summary(self):
+        _, quantities, prices = self.columns()
+        if not len(prices):
+            return {'items': 0, 'total_quantity': 0, 'total_value': 0.0}
+        return {'items': int(len(prices)), 'total_quantity': int(quantities.sum()),
+                'total_value': round(float(np.dot(quantities, prices)), 2),
+                'min_price': float(prices.min()), 'mean_price': round(float(prices.mean()), 2),
+                'max_price': float(prices.max()), 'median_quantity': float(np.median(quantities))}
+
+    # {band label: {'items': n, 'value': stock value}} with the PRICE_BANDS of the report
+    def value_by_price_band(self):
+        _, quantities, prices = self.columns()
+        bands = np.searchsorted(np.array(PRICE_BANDS, dtype=np.float64), prices, side='right')
+        counts = np.bincount(bands, minlength=len(PRICE_BANDS) + 1)
+        values = np.bincount(bands, weights=quantities * prices, minlength=len(PRICE_BANDS) + 1)
+        return {label: {'items': int(count), 'value': round(float(value), 2)}
+                for label, count, value in zip(price_band_labels(), counts, values)}
+
+    # [(from, to, items)] with quantities split into equal-width bins
+    def quantity_histogram(self, bins=10):
+        _, quantities, _ = self.columns()
+        if not len(quantities):
+            return []
+        counts, edges = np.histogram(quantities, bins=bins)
+        return [(float(low), float(high), int(count)) for low, high, count in zip(edges, edges[1:], counts)]
+
+    # IDs of the items matching every given condition, e.g. select(value_above=10000)
+    def select(self, value_above=None, quantity_below=None, price_min=None, price_max=None):
+        ids, quantities, prices = self.columns()
+        mask = np.ones(len(ids), dtype=bool)
+        if value_above is not None:
+            mask &= quantities * prices > value_above
+        if quantity_below is not None:
+            mask &= quantities < quantity_below
+        if price_min is not None:
+            mask &= prices >= price_min
+        if price_max is not None:
+            mask &= prices <= price_max
+        return ids[mask].tolist()
+
+    # [(id, value)] of the n items with the most stock value
+    def top_by_value(self, n=10):
+        ids, quantities, prices = self.columns()
+        values = quantities * prices
+        if n <= 0:
+            return []
+        if n < len(values):
+            top = np.argpartition(values, -n)[-n:]
+        else:
+            top = np.arange(len(values))
+        top = top[np.argsort(-values[top], kind='stable')]
+        return [(int(ids[row]), round(float(values[row]), 2)) for row in top]
+
+def format_analytics(result):
+    lines = [f"{key.replace('_', ' ').capitalize() + ':':<17}{value}" for key, value in result['summary'].items()]
+    lines += ["", "Price band              Items          Value"]
+    lines += [f"  {label:<18} {band['items']:>8}  ₱{band['value']:>14,.2f}" for label, band in result['price_bands'].items()]
+    lines += ["", "Quantity             Items"]
+    lines += [f"  {low:>8.0f} - {high:<8.0f} {count:>6}" for low, high, count in result['quantity_histogram']]
+    if 'selected' in result:
+        lines += ["", f"{len(result['selected'])} item(s) match: {result['selected'][:20]}"
+                  + (" ..." if len(result['selected']) > 20 else "")]
+    return "\n".join(lines)
+
+#END OF ANALYTICS SECTION-------------
+
+
+#LEDGER SECTION--------------
+# Every stock movement (add, adjust, update, delete, import, bulk adjust) is appended to
+# inventory.txt.ledger/YYYY-MM-DD.jsonl as one [timestamp, id, delta, reason] line.
+# One file per day is the time index: a date range only opens the days inside it.
+# Each finished day also gets a YYYY-MM-DD.rollup.json with the totals per ID
+# ({id: [received, issued, movements]}), so daily totals never re-read the movements and
+# a search for one item skips every day in which the item did not move
+LEDGER_MODE = True
+DAY_SECONDS = 24 * 60 * 60
+
+def get_ledger_dir():
+    return get_side_file_base() + ".ledger"
+
+def ledger_day(timestamp):
+    return time.strftime("%Y-%m-%d", time.localtime(timestamp))
+
+# Append (id, delta, reason) movements, all stamped now, with a single write
+def record_movements(movements, timestamp=None):
+    if not LEDGER_MODE or not movements:
+        return
+    timestamp = time.time() if timestamp is None else timestamp
+    stamp = round(timestamp, 3)
+    reasons = {}  # reason -> its JSON text, bulk changes share one
+    lines = "".join(f"[{stamp}, {item_id}, {delta}, "
+                    f"{reasons.get(reason) or reasons.setdefault(reason, json.dumps(reason))}]\n"
+                    for item_id, delta, reason in movements)
+    try:
+        os.makedirs(get_ledger_dir(), exist_ok=True)
+        with open(os.path.join(get_ledger_dir(), ledger_day(timestamp) + ".jsonl"), 'a', encoding='utf-8') as f:
+            f.write(lines)
+    except OSError as e:
+        print(f"Error writing stock ledger: {e}", file=sys.stderr)
+
+# Days with a ledger file, oldest first, optionally only from start_day to end_day ('YYYY-MM-DD')
+def ledger_days(start_day=None, end_day=None):
+    try:
+        names = os.listdir(get_ledger_dir())
+    except FileNotFoundError:
+        return []
+    days = sorted(name[:-len(".jsonl")] for name in names if name.endswith(".jsonl"))
+    return [day for day in days if (start_day is None or day >= start_day) and (end_day is None or day <= end_day)]
+
+def read_ledger_day(day):
+    with open(os.path.join(get_ledger_dir(), day + ".jsonl"), 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                timestamp, item_id, delta, reason = json.loads(line)
+            except ValueError:
+                continue  # half-written last line after a crash
+            yield timestamp, item_id, delta, reason
+
+# {id: [received, issued, movements]} for one day; saved for days that are over
+def ledger_rollup(day):
+    path = os.path.join(get_ledger_dir(), day + ".jsonl")
+    rollup_path = os.path.join(get_ledger_dir(), day + ".rollup.json")
+    try:
+        if os.path.getmtime(rollup_path) >= os.path.getmtime(path):
+            with open(rollup_path, 'r', encoding='utf-8') as f:
+                return {int(item_id): totals for item_id, totals in json.load(f).items()}
+    except (OSError, ValueError):
+        pass
+    rollup = {}
+    for _, item_id, delta, _ in read_ledger_day(day):
+        totals = rollup.setdefault(item_id, [0, 0, 0])
+        totals[0 if delta > 0 else 1] += abs(delta)
+        totals[2] += 1
+    if day < ledger_day(time.time()):
+        try:
+            write_atomically(rollup_path, lambda f: json.dump(rollup, f))
+        except OSError:
+            pass  # only a cache
+    return rollup
+
+# Movements as (timestamp, id, delta, reason), oldest first, for one item or all of them,
+# between two timestamps (either can be None)
+def item_movements(item_id=None, start=None, end=None):
+    for day in ledger_days(start and ledger_day(start), end and ledger_day(end)):
+        if item_id is not None and item_id not in ledger_rollup(day):
+            continue
+        for movement in read_ledger_day(day):
+            if ((item_id is None or movement[1] == item_id)
+                    and (start is None or movement[0] >= start) and (end is None or movement[0] <= end)):
+                yield movement
+
+# [(day, received, issued, movements)] per day, for one item or all of them
+def daily_rollups(item_id=None, start_day=None, end_day=None):
+    result = []
+    for day in ledger_days(start_day, end_day):
+        rollup = ledger_rollup(day)
+        rows = [rollup[item_id]] if item_id in rollup else [] if item_id is not None else rollup.values()
+        received, issued, count = (sum(column) for column in zip(*rows)) if rows else (0, 0, 0)
+        if count:
+            result.append((day, received, issued, count))
+    return result
+
+# 'YYYY-MM-DD' -> timestamp of the start of that day (local time), raises ValueError
+def parse_day(text):
+    return time.mktime(time.strptime(text.strip(), "%Y-%m-%d"))
+
+def format_movements(movements, names):
+    lines = ["When                 ID    Name                 Change  Reason",
+             "---------------------------------------------------------------"]
+    lines += [f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))}  {item_id:<5} "
+              f"{names.get(item_id, '(deleted)')[:18]:<18} {delta:>+7}  {reason}"
+              for timestamp, item_id, delta, reason in movements]
+    return "\n".join(lines)
+
+def format_rollups(rollups):
+    lines = ["Day           Received    Issued   Net  Movements",
+             "-------------------------------------------------"]
+    lines += [f"{day}  {received:>8}  {issued:>8}  {received - issued:>+5}  {count:>9}"
+              for day, received, issued, count in rollups]
+    return "\n".join(lines)
+
+def movement_history_menu(inventory):
+    print("STOCK MOVEMENT HISTORY")
+    print("----------------------")
+
+    term = input("\nEnter ID or Name of an item, or press Enter for all items (0 to cancel): ").strip()
+    if term == '0':
+        return
+    item_id = None
+    if term:
+        matches = find_items(inventory, term)
+        if not matches:
+            print("\nNo items found.")
+            input("\nPress Enter to continue...")
+            return
+        item_id = matches[0]['id']
+        print(f"\nShowing '{matches[0]['name']}' (ID: {item_id})")
+    days = get_valid_input("How many days back? (e.g. 7): ", int)
+    if days is None:
+        return
+    start = parse_day(ledger_day(time.time() - (days - 1) * DAY_SECONDS))
+    movements = list(item_movements(item_id, start))
+    if not movements:
+        print("\nNo stock movements in that period.")
+    else:
+        names = {item['id']: item['name'] for item in map(inventory.get, {m[1] for m in movements}) if item}
+        sys.stdout.write("\n" + format_movements(movements[-PAGE_SIZE * 5:], names) + "\n")
+        if len(movements) > PAGE_SIZE * 5:
+            print(f"(latest {PAGE_SIZE * 5} of {len(movements)} shown)")
+        print("\n" + format_rollups(daily_rollups(item_id, ledger_day(start))))
+    input("\nPress Enter to return to menu...")
+
+#END OF LEDGER SECTION-------------
+
+
+#SNAPSHOT SECTION--------------
+# Point-in-time copies of the inventory in inventory.txt.snapshots/.
+# Items are cut into chunks by ID (SNAPSHOT_CHUNK_IDS IDs per chunk), each chunk is stored
+# once as <sha256>.chunk (zlib-compressed inventory.txt lines), and a snapshot is just a
+# <time>.manifest.json listing its chunks, so a new snapshot only writes the chunks that
+# changed since any earlier one. Once there is a snapshot, every saved change is also
+# appended to YYYY-MM-DD.changes there, as "time,+,id,name,quantity,price" or "time,-,id".
+# Restoring to a time loads the last snapshot taken before it and replays the changes made
+# between the two, instead of going through the whole history.
+# A snapshot is taken at most every SNAPSHOT_INTERVAL seconds from the menu or before an
+# import or a bulk adjust (the change log covers the time since the last one), and always
+# before a restore. Only the newest SNAPSHOT_KEEP are kept; chunks no longer listed in any
+# of them and change logs older than the oldest are deleted
+SNAPSHOT_CHUNK_IDS = 1024
+SNAPSHOT_INTERVAL = 60 * 60
+SNAPSHOT_KEEP = 48
+
+def get_snapshot_dir():
+    return get_side_file_base() + ".snapshots"
+
+# [(time, path)] of every snapshot, oldest first
+def list_snapshots():
+    try:
+        names = os.listdir(get_snapshot_dir())
+    except FileNotFoundError:
+        return []
+    snapshots = []
+    for name in names:
+        if name.endswith(".manifest.json"):
+            try:
+                snapshots.append((int(name.split(".")[0]) / 1000, os.path.join(get_snapshot_dir(), name)))
+            except ValueError:
+                continue
+    return sorted(snapshots)
+
+def read_manifest(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def write_chunk(data):
+    digest = hashlib.sha256(data).hexdigest()
+    path = os.path.join(get_snapshot_dir(), digest + ".chunk")
+    if not os.path.exists(path):
+        with open(path + ".tmp", 'wb') as f:
+            f.write(zlib.compress(data))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)  # the manifest write below syncs the directory
+    return digest
+
+def read_chunk(digest):
+    with open(os.path.join(get_snapshot_dir(), digest + ".chunk"), 'rb') as f:
+        return zlib.decompress(f.read())
+
+# Save the current inventory as a snapshot, returns its time. Taken under the write lock,
+# so it has every change other processes made before it and none of the ones logged after it
+def take_snapshot(inventory, reason='manual'):
+    with write_lock(inventory):
+        return write_snapshot(inventory, reason)
+
+# take_snapshot() without taking the lock (the caller holds it and inventory is up to date)
+def write_snapshot(inventory, reason):
+    os.makedirs(get_snapshot_dir(), exist_ok=True)
+    groups = {}
+    for item_id, name, qty, price in inventory.rows():
+        groups.setdefault(item_id // SNAPSHOT_CHUNK_IDS, []).append((item_id, f"{item_id},{name},{qty},{price}\n"))
+    chunks = [write_chunk("".join(line for _, line in sorted(groups[key])).encode('utf-8'))
+              for key in sorted(groups)]
+    taken = time.time()
+    manifest = {'time': taken, 'reason': reason, 'items': len(inventory), 'chunks': chunks}
+    path = os.path.join(get_snapshot_dir(), f"{int(taken * 1000)}.manifest.json")
+    write_atomically(path, lambda f: json.dump(manifest, f))
+    prune_snapshots()
+    return taken
+
+# Delete all but the newest SNAPSHOT_KEEP snapshots, then the files only they needed
+# (called under the write lock, so no snapshot is being written meanwhile)
+def prune_snapshots():
+    snapshots = list_snapshots()
+    if len(snapshots) <= SNAPSHOT_KEEP:
+        return
+    for _, path in snapshots[:-SNAPSHOT_KEEP]:
+        os.remove(path)
+    kept = snapshots[-SNAPSHOT_KEEP:]
+    used = set()
+    try:
+        for _, path in kept:
+            used.update(read_manifest(path)['chunks'])
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error reading snapshot, unused chunks are kept: {e}", file=sys.stderr)
+        return
+    first_day = ledger_day(kept[0][0])
+    for name in os.listdir(get_snapshot_dir()):
+        if ((name.endswith(".chunk") and name[:-len(".chunk")] not in used)
+                or (name.endswith(".changes") and name[:-len(".changes")] < first_day)):
+            os.remove(os.path.join(get_snapshot_dir(), name))
+
+# Append the current state of these items (or "-" if deleted) to today's change log.
+# Does nothing until the first snapshot, since changes are only replayed on top of one
+def log_row_changes(inventory, item_ids):
+    item_ids = [item_id for item_id in item_ids if item_id in inventory.dirty]
+    if not item_ids or not os.path.isdir(get_snapshot_dir()):
+        return
+    now = time.time()
+    stamp = f"{now:.3f}"
+    lines = []
+    for item_id in item_ids:
+        if item_id in inventory:
+            row = ItemRow(inventory, item_id)
+            lines.append(f"{stamp},+,{item_id},{row['name']},{row['quantity']},{row['price']}\n")
+        else:
+            lines.append(f"{stamp},-,{item_id}\n")
+    try:
+        with open(os.path.join(get_snapshot_dir(), ledger_day(now) + ".changes"), 'a', encoding='utf-8') as f:
+            f.write("".join(lines))
+    except OSError as e:
+        print(f"Error writing snapshot change log: {e}", file=sys.stderr)
+
+# Apply the logged changes made between two timestamps to inventory. Records are whole rows,
+# so one logged just before the snapshot (same millisecond) can safely be applied again
+def replay_row_changes(inventory, start, end):
+    try:
+        names = os.listdir(get_snapshot_dir())
+    except FileNotFoundError:
+        return
+    days = sorted(name[:-len(".changes")] for name in names if name.endswith(".changes"))
+    for day in days:
+        if day < ledger_day(start) or day > ledger_day(end):
+            continue
+        with open(os.path.join(get_snapshot_dir(), day + ".changes"), 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # a half-written last line after a crash
+                parts = line.rstrip("\n").split(",")
+                try:
+                    if not start <= float(parts[0]) <= end:
+                        continue
+                    if parts[1] == '+' and len(parts) >= 6:
+                        inventory.put(int(parts[2]), ",".join(parts[3:-2]), int(parts[-2]), float(parts[-1]))
+                    elif parts[1] == '-' and len(parts) == 3 and int(parts[2]) in inventory:
+                        inventory.remove(int(parts[2]))
+                except (ValueError, IndexError):
+                    continue
+
+def snapshot_due():
+    snapshots = list_snapshots()
+    return not snapshots or time.time() - snapshots[-1][0] >= SNAPSHOT_INTERVAL
+
+# Take a snapshot if the last one is older than SNAPSHOT_INTERVAL
+def auto_snapshot(inventory, reason='auto'):
+    if snapshot_due():
+        try:
+            take_snapshot(inventory, reason)
+        except OSError as e:
+            print(f"Error taking snapshot: {e}", file=sys.stderr)
+
+# A new Inventory with the state at the given time (the last snapshot before it plus the
+# changes logged up to that time), raises ValueError
+def inventory_at(timestamp):
+    snapshots = [snapshot for snapshot in list_snapshots() if snapshot[0] <= timestamp]
+    if not snapshots:
+        raise ValueError("No snapshot was taken before that time")
+    snapshot_time, path = snapshots[-1]
+    inventory = Inventory()
+    for digest in read_manifest(path)['chunks']:
+        lines = read_chunk(digest).decode('utf-8').splitlines()
+        for item_id, name, qty, price in parse_inventory_lines(lines):
+            inventory.put(item_id, name, qty, price)
+    replay_row_changes(inventory, snapshot_time, timestamp)
+    inventory.dirty.clear()
+    return inventory
+
+# Put the whole inventory back to how it was at the given time (a snapshot of the current
+# state is taken first, so a restore can be undone). Returns the number of items restored
+def restore_inventory(inventory, timestamp):
+    with write_lock(inventory):
+        target = inventory_at(timestamp)
+        take_snapshot(inventory, 'before restore')
+        movements = []
+        removed = []
+        for item_id, _, qty, _ in list(inventory.rows()):
+            if item_id not in target:
+                inventory.remove(item_id)
+                removed.append(item_id)
+                if qty:
+                    movements.append((item_id, -qty, 'restore'))
+        for item_id, name, qty, price in target.rows():
+            old_qty = inventory.get_field(item_id, 'quantity') if item_id in inventory else 0
+            inventory.put(item_id, name, qty, price)
+            if qty != old_qty:
+                movements.append((item_id, qty - old_qty, 'restore'))
+        save_all(inventory)
+        if removed and max(removed) >= inventory.id_allocator.high_water:
+            save_high_water(max(removed))  # so the removed IDs are not handed out again
+        record_movements(movements)
+    return len(inventory)
+
+# 'YYYY-MM-DD HH:MM[:SS]' -> timestamp; a date alone means the end of that day. Raises ValueError
+def parse_time(text):
+    text = text.strip()
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
+        try:
+            return time.mktime(time.strptime(text, fmt))
+        except ValueError:
+            continue
+    return parse_day(text) + DAY_SECONDS - 0.001
+
+def format_snapshots(snapshots):
+    lines = ["#    Taken                Items  Reason",
+             "----------------------------------------------"]
+    for number, (taken, path) in enumerate(snapshots, 1):
+        try:
+            manifest = read_manifest(path)
+        except (OSError, ValueError):
+            continue
+        lines.append(f"{number:<4} {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(taken))}  "
+                     f"{manifest['items']:>5}  {manifest['reason']}")
+    return "\n".join(lines)
+
+def snapshots_menu(inventory):
+    while True:
+        print("SNAPSHOTS AND RESTORE")
+        print("---------------------")
+
+        snapshots = list_snapshots()
+        if snapshots:
+            sys.stdout.write("\n" + format_snapshots(snapshots[-PAGE_SIZE:]) + "\n")
+        else:
+            print("\nNo snapshots yet")
+        print("\nT = Take a snapshot now, R = Restore to a date/time")
+        choice = input("Press Enter to return to menu, or choose an option: ").strip().lower()
+        if choice == 't':
+            take_snapshot(inventory)
+            print("\nSnapshot saved.")
+        elif choice == 'r':
+            when = get_valid_input("Restore to (YYYY-MM-DD or YYYY-MM-DD HH:MM): ", str)
+            if when is None:
+                continue
+            try:
+                timestamp = parse_time(when)
+                confirm = input(f"\nReplace the whole inventory with its state at "
+                                f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))}? (Y/N): ")
+                if confirm.strip().lower() != 'y':
+                    print("\nRestore cancelled.")
+                else:
+                    count = restore_inventory(inventory, timestamp)
+                    print(f"\nRestored {count} item(s).")
+            except ValueError as e:
+                print(f"\nError: {e}")
+        else:
+            return
+        input("\nPress Enter to continue...")
+
+#END OF SNAPSHOT SECTION-------------
+
 # Display credits (w/ github links)
 def show_credits():
     """Display credits screen"""
@@ -324,16 +2834,1009 @@ def show_credits():
     print("GitHub: https://github.com/hnutcelest")
     input("\nPress Enter to return to menu...")
 
+#SERVER SECTION--------------
+# A small HTTP/JSON API over the core operations, for POS terminals and dashboards:
+#   GET    /items[?sort=name&desc=1&below=5&page=1&page_size=20]
+#   POST   /items                  {"name": ..., "quantity": ..., "price": ..., "id": optional}
+#   GET    /items/<id>
+#   PATCH  /items/<id>             any of {"name", "quantity", "price"}  (PUT works too)
+#   DELETE /items/<id>
+#   POST   /items/<id>/adjust      {"change": -3, "reason": "sale"}
+#   GET    /search?q=...[&fuzzy=1&limit=10]
+#   GET    /low-stock, /report
+# Every request is answered from an in-memory copy of the inventory owned by the asyncio
+# event loop. Changes go one at a time to a single writer thread, which makes them on the
+# inventory it was started with (taking the file lock, saving, syncing), then hands the
+# new values of the changed rows to the event loop to copy over. So saving to disk never
+# holds up the readers, and since only the loop touches its copy, they never wait for a
+# lock or see half a change. The writer also picks up other processes' changes every
+# SERVER_REFRESH_INTERVAL seconds
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 8080
+SERVER_REFRESH_INTERVAL = 1.0
+SERVER_MAX_BODY = 1024 * 1024
+
+HTTP_STATUS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+# (method, path, {query: value}, {header: value}, body), or None once the client is done
+async def read_request(reader):
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    try:
+        method, target, _ = request_line.decode('latin-1').split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode('latin-1').partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HTTPError(400, "Bad Content-Length")
+    if length > SERVER_MAX_BODY:
+        raise HTTPError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    url = urlsplit(target)
+    query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+    return method.upper(), url.path, query, headers, body
+
+def http_response(status, result, keep_alive=True):
+    body = json.dumps(result).encode('utf-8')
+    head = (f"HTTP/1.1 {status} {HTTP_STATUS.get(status, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode('latin-1') + body
+
+def json_body(body):
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError as e:
+        raise HTTPError(400, f"Invalid JSON: {e}")
+    if not isinstance(data, dict):
+        raise HTTPError(400, "Expected a JSON object")
+    return data
+
+def query_int(query, key, default=None):
+    if key not in query:
+        return default
+    try:
+        return validate_input(query[key], int)
+    except ValueError as e:
+        raise HTTPError(400, f"{key}: {e}")
+
+def optional_text(value):
+    return None if value is None else str(value)
+
+# names have to come in as JSON strings, str() would turn null into "None"
+def json_name(value):
+    if not isinstance(value, str):
+        raise HTTPError(400, "name must be a string")
+    return value
+
+class InventoryServer:
+    def __init__(self, inventory):
+        self.working = inventory  # only used by the writer thread
+        self.inventory = copy_inventory(inventory)  # only used on the event loop
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inventory-writer")
+
+    # Run operation(inventory, *args) on the writer thread; it must not return ItemRows,
+    # since those would read the writer's inventory from the event loop
+    async def write(self, operation, *args):
+        loop = asyncio.get_running_loop()
+        def run():
+            self.working.changed = set()
+            try:
+                return operation(self.working, *args)
+            finally:
+                # scheduled before the result, so the caller sees its change
+                loop.call_soon_threadsafe(self.apply, self.take_changes())
+        return await loop.run_in_executor(self.writer, run)
+
+    # (writer thread) [(id, (name, quantity, price) or None if deleted)] changed by the last
+    # operation, or a whole new copy if it reloaded the inventory from disk
+    def take_changes(self):
+        working, changed = self.working, self.working.changed
+        working.changed = None
+        if changed is None:
+            return copy_inventory(working)
+        return [(item_id, (working.get_field(item_id, 'name'), working.get_field(item_id, 'quantity'),
+                           working.get_field(item_id, 'price')) if item_id in working else None)
+                for item_id in changed]
+
+    # (event loop) copy the writer's changes over
+    def apply(self, changes):
+        inventory = self.inventory
+        if isinstance(changes, Inventory):
+            inventory.replace_with(changes)
+        else:
+            for item_id, values in changes:
+                if values is not None:
+                    inventory.put(item_id, *values)
+                elif item_id in inventory:
+                    inventory.remove(item_id)
+        inventory.dirty.clear()  # never saved from here
+
+    def read(self, operation, *args):
+        return operation(self.inventory, *args)
+
+    async def keep_refreshed(self):
+        def refresh(inventory):
+            with write_lock(inventory):
+                pass  # taking the lock brings the inventory up to date
+        while True:
+            await asyncio.sleep(SERVER_REFRESH_INTERVAL)
+            try:
+                await self.write(refresh)
+            except Exception as e:
+                print(f"Error refreshing inventory: {e}", file=sys.stderr)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    method, path, query, headers, body = request
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+                    status, result = await self.route(method, path, query, body)
+                except HTTPError as e:
+                    status, result = e.status, {'error': str(e)}
+                except ValueError as e:
+                    status, result = 400, {'error': str(e)}
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    break
+                except Exception as e:
+                    status, result = 500, {'error': str(e)}
+                writer.write(http_response(status, result, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, path, query, body):
+        parts = [part for part in path.split("/") if part]
+        if parts == ['items']:
+            if method == 'GET':
+                return 200, self.read(list_items_json, query)
+            if method == 'POST':
+                data = json_body(body)
+                item_id = data.get('id')
+                item_id = None if item_id is None else validate_input(str(item_id), int)
+                name = json_name(data.get('name') or '')
+                return 201, await self.write(lambda inventory: create_item(
+                    inventory, name, data.get('quantity', ''), data.get('price', ''), item_id).to_dict())
+            raise HTTPError(405, f"{method} is not supported here")
+        elif len(parts) in (2, 3) and parts[0] == 'items':
+            try:
+                item_id = int(parts[1])
+            except ValueError:
+                raise HTTPError(404, f"No item {parts[1]!r}")
+            if item_id not in self.inventory:
+                raise HTTPError(404, f"Item with ID {item_id} not found")
+            if len(parts) == 3:
+                if parts[2] != 'adjust':
+                    raise HTTPError(404, f"Unknown path {path}")
+                if method != 'POST':
+                    raise HTTPError(405, "Use POST")
+                data = json_body(body)
+                try:
+                    change = int(str(data.get('change', '')))
+                except ValueError:
+                    raise HTTPError(400, "change must be a whole number, e.g. 5 or -3")
+                quantity = await self.write(change_stock, item_id, change, str(data.get('reason') or 'adjust'))
+                return 200, {'id': item_id, 'quantity': quantity}
+            if method == 'GET':
+                return 200, self.read(lambda inventory: get_item(inventory, item_id).to_dict())
+            if method in ('PATCH', 'PUT'):
+                data = json_body(body)
+                name = data.get('name')
+                name = None if name is None else json_name(name)
+                return 200, await self.write(lambda inventory: modify_item(
+                    inventory, item_id, name, optional_text(data.get('quantity')),
+                    optional_text(data.get('price'))).to_dict())
+            if method == 'DELETE':
+                return 200, await self.write(remove_item, item_id)
+            raise HTTPError(405, f"{method} is not supported here")
+        elif parts in (['search'], ['low-stock'], ['report']) and method != 'GET':
+            raise HTTPError(405, f"{method} is not supported here")
+        elif parts == ['search']:
+            term = query.get('q', '')
+            if query.get('fuzzy') in ('1', 'true', 'yes'):
+                limit = query_int(query, 'limit', 10)
+                return 200, self.read(lambda inventory: [item.to_dict() for item in inventory.fuzzy_search(term, limit)])
+            return 200, self.read(lambda inventory: [item.to_dict() for item in find_items(inventory, term)])
+        elif parts == ['low-stock']:
+            return 200, self.read(lambda inventory: [dict(item, threshold=threshold)
+                                                     for item, threshold in low_stock_items(inventory)])
+        elif parts == ['report']:
+            return 200, self.read(inventory_report, query_int(query, 'top', 5))
+        raise HTTPError(404, f"Unknown path {path}")
+
+# GET /items: the same sorting, filter and paging as the view command
+def list_items_json(inventory, query):
+    sort_by = query.get('sort', 'id')
+    if sort_by not in SORT_FIELDS:
+        raise HTTPError(400, f"sort must be one of {', '.join(SORT_FIELDS)}")
+    rows = inventory.sorted_rows(sort_by, query.get('desc') in ('1', 'true', 'yes'), query_int(query, 'below'))
+    page = query_int(query, 'page')
+    if page:
+        page_size = query_int(query, 'page_size', PAGE_SIZE)
+        rows = rows[(page - 1) * page_size:page * page_size]
+    return [dict(zip(ItemRow.FIELDS, inventory.row_values(row))) for row in rows]
+
+# Serve until Ctrl+C or SIGTERM
+async def serve_inventory(inventory, host=SERVER_HOST, port=SERVER_PORT):
+    app = InventoryServer(inventory)
+    server = await asyncio.start_server(app.handle_connection, host, port)
+    print(f"Serving the inventory on http://{host}:{server.sockets[0].getsockname()[1]} (Ctrl+C to stop)", flush=True)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for name in ('SIGINT', 'SIGTERM'):
+        try:
+            loop.add_signal_handler(getattr(signal, name), stop.set)
+        except (NotImplementedError, AttributeError):  # Windows: Ctrl+C raises KeyboardInterrupt instead
+            pass
+    refresher = asyncio.create_task(app.keep_refreshed())
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        refresher.cancel()
+        app.writer.shutdown(wait=True)
+
+# A separate Inventory with the same items
+def copy_inventory(inventory):
+    copy = Inventory()
+    for item_id, name, qty, price in inventory.rows():
+        copy.put(item_id, name, qty, price)
+    copy.dirty.clear()
+    return copy
+
+#END OF SERVER SECTION-------------
+
+
+#EXPORT SECTION--------------
+# Exports stream (id, name, quantity, price) rows from the storage backend (inventory.txt read
+# line by line with the journal laid over it, or an SQLite cursor) and write them
+# EXPORT_CHUNK_ROWS at a time, so memory use does not grow with the catalog. Formats: csv, jsonl, and 'columnar', a compact binary file of
+# row groups (little-endian), similar in spirit to Parquet:
+#   header     magic "IMSC", version
+#   row group  "ROWG", row count, name bytes, then the ids (int64), quantities (int64),
+#              prices (float64) and name lengths (int32) of the group, and the utf-8 names
+#   footer     "INDX", the byte offset and row count of each group, then the group count,
+#              total rows, index size and "IMSC" again (so a reader can start from the end)
+# Any of them can be gzip-compressed (--gzip, or a file name ending in .gz)
+EXPORT_CHUNK_ROWS = 10000
+EXPORT_FORMATS = ('csv', 'jsonl', 'columnar')
+COLUMNAR_MAGIC = b"IMSC"
+COLUMNAR_VERSION = 1
+COLUMNAR_HEADER = struct.Struct("<4sHxx")
+COLUMNAR_GROUP = struct.Struct("<4sQQ")      # "ROWG", rows, name bytes
+COLUMNAR_INDEX_ENTRY = struct.Struct("<QQ")  # offset, rows
+COLUMNAR_FOOTER = struct.Struct("<QQQ4s")    # groups, rows, index size, magic
+
+# Lists of up to size rows
+def chunked(rows, size=EXPORT_CHUNK_ROWS):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def little_endian_bytes(column):
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column.tobytes()
+
+# Format from the file name: .jsonl/.json, .imsc (columnar), anything else csv; a .gz ending is skipped
+def export_format_for(path):
+    name = path.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    if name.endswith(('.jsonl', '.json')):
+        return 'jsonl'
+    if name.endswith('.imsc'):
+        return 'columnar'
+    return 'csv'
+
+# Write rows to f (a text file for csv/jsonl, a binary one for columnar), returns the row count
+def export_items(rows, f, fmt='csv'):
+    if fmt == 'columnar':
+        return write_columnar(rows, f)
+    count = 0
+    writer = csv.writer(f)
+    if fmt == 'csv':
+        writer.writerow(('id', 'name', 'quantity', 'price'))
+    for chunk in chunked(rows):
+        if fmt == 'jsonl':
+            f.write("".join(json.dumps({'id': item_id, 'name': name, 'quantity': qty, 'price': price}) + "\n"
+                            for item_id, name, qty, price in chunk))
+        else:
+            writer.writerows(chunk)
+        count += len(chunk)
+    return count
+
+def write_columnar(rows, f):
+    f.write(COLUMNAR_HEADER.pack(COLUMNAR_MAGIC, COLUMNAR_VERSION))
+    offset = COLUMNAR_HEADER.size
+    index = bytearray()
+    groups = total = 0
+    for chunk in chunked(rows):
+        ids, quantities, prices, name_len = array('q'), array('q'), array('d'), array('i')
+        names = bytearray()
+        for item_id, name, qty, price in chunk:
+            data = name.encode('utf-8')
+            ids.append(item_id)
+            quantities.append(qty)
+            prices.append(price)
+            name_len.append(len(data))
+            names += data
+        block = b"".join((COLUMNAR_GROUP.pack(b"ROWG", len(chunk), len(names)), little_endian_bytes(ids),
+                          little_endian_bytes(quantities), little_endian_bytes(prices),
+                          little_endian_bytes(name_len), names))
+        f.write(block)
+        index += COLUMNAR_INDEX_ENTRY.pack(offset, len(chunk))
+        offset += len(block)
+        groups += 1
+        total += len(chunk)
+    f.write(b"INDX" + index + COLUMNAR_FOOTER.pack(groups, total, len(index), COLUMNAR_MAGIC))
+    return total
+
+# Read a columnar export (gzipped or not) one row group at a time, yields (id, name, quantity, price)
+def read_columnar_export(path):
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == b"\x1f\x8b"
+    with (gzip.open(path, 'rb') if compressed else open(path, 'rb')) as f:
+        magic, version = COLUMNAR_HEADER.unpack(f.read(COLUMNAR_HEADER.size))
+        if magic != COLUMNAR_MAGIC or version != COLUMNAR_VERSION:
+            raise ValueError(f"not a version {COLUMNAR_VERSION} columnar export")
+        while True:
+            tag = f.read(4)
+            if tag != b"ROWG":
+                if tag != b"INDX":
+                    raise ValueError("columnar export is truncated")
+                return
+            _, count, names_size = COLUMNAR_GROUP.unpack(tag + f.read(COLUMNAR_GROUP.size - 4))
+            columns = []
+            for typecode in ('q', 'q', 'd', 'i'):
+                column = array(typecode)
+                data = f.read(count * column.itemsize)
+                if len(data) != count * column.itemsize:
+                    raise ValueError("columnar export is truncated")
+                column.frombytes(data)
+                if sys.byteorder == 'big':
+                    column.byteswap()
+                columns.append(column)
+            names = f.read(names_size)
+            if len(names) != names_size:
+                raise ValueError("columnar export is truncated")
+            ids, quantities, prices, name_len = columns
+            start = 0
+            for row in range(count):
+                end = start + name_len[row]
+                yield ids[row], names[start:end].decode('utf-8'), quantities[row], prices[row]
+                start = end
+
+# Open the export target: a file, or stdout for '-' (binary for columnar or gzip)
+@contextmanager
+def open_export(path, fmt, compress=False):
+    binary = fmt == 'columnar'
+    if path == "-":
+        if not compress:
+            yield sys.stdout.buffer if binary else sys.stdout
+            sys.stdout.flush()
+            return
+        sys.stdout.flush()
+        raw = gzip.GzipFile(fileobj=sys.stdout.buffer, mode='wb')  # closing it leaves stdout open
+    else:
+        raw = gzip.open(path, 'wb') if compress else open(path, 'wb')
+    with raw:
+        if binary:
+            yield raw
+        else:
+            text = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+            yield text
+            text.flush()
+            text.detach()
+
+#END OF EXPORT SECTION-------------
+
+
+#BENCHMARK SECTION--------------
+# Times the hot paths on generated inventories in a temporary folder (the real inventory is
+# never touched) and reports, per inventory size and operation:
+#   p50_ms / p95_ms / p99_ms   latency of one call
+#   per_sec                    calls per second (rows per second for load and save)
+#   peak_mb                    peak memory allocated by one call (traced separately)
+# Results are JSON so a later run can be compared with a saved baseline:
+#   python IMS.py bench --output baseline.json
+#   python IMS.py bench --baseline baseline.json     (exit code 1 if something got slower)
+# find_by_id and search_name are what find_item_by_id_or_name and search_item do without the prompts
+BENCH_SIZES = (1000, 10000, 100000)
+BENCH_REPEAT = 3        # runs of each whole-file operation (load/save)
+BENCH_QUERIES = 1000    # calls of each lookup operation
+BENCH_TOLERANCE = 0.20  # slower than the baseline by more than this counts as a regression
+BENCH_WORDS = ("Apple", "Banana", "Canned", "Sardines", "Rice", "Soap", "Milk", "Coffee", "Noodles",
+               "Bread", "Sugar", "Salt", "Vinegar", "Soy", "Sauce", "Corned", "Beef", "Tuna", "Eggs",
+               "Oil", "Shampoo", "Toothpaste", "Candles", "Matches", "Biscuits", "Juice", "Water", "Chips")
+BENCH_OPERATIONS = ('load_text', 'load_binary', 'save_text', 'find_by_id', 'search_name',
+                    'fuzzy_search', 'generate_new_id', 'change_stock')
+
+# Write an inventory.txt with `size` random items (always the same ones for the same seed)
+def write_synthetic_inventory(path, size, seed=0):
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        for start in range(1, size + 1, 10000):
+            f.write("".join(f"{item_id},{rng.choice(BENCH_WORDS)} {rng.choice(BENCH_WORDS)} {item_id},"
+                            f"{rng.randint(0, 500)},{rng.randint(100, 200000) / 100}\n"
+                            for item_id in range(start, min(start + 10000, size + 1))))
+
+# Call func(arg) for every arg, returns the sorted time of each call
+def time_calls(func, args):
+    times = []
+    for arg in args:
+        start = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - start)
+    return sorted(times)
+
+def peak_memory_mb(func, arg):
+    tracemalloc.start()
+    try:
+        func(arg)
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+def summarize_times(times, rows=1):
+    def percentile(fraction):
+        return round(times[min(len(times) - 1, int(fraction * len(times)))] * 1000, 4)
+    return {'p50_ms': percentile(0.50), 'p95_ms': percentile(0.95), 'p99_ms': percentile(0.99),
+            'per_sec': round(rows * len(times) / sum(times), 1) if sum(times) else None}
+
+# {operation: (func, [args], rows per call)} for one generated inventory
+def benchmark_cases(inventory, size, repeat, queries, rng):
+    binary_path = file_path + ".bin"
+    save_binary_snapshot(inventory, binary_path)
+    ids = [rng.randint(1, size) for _ in range(queries)]
+    words = [rng.choice(BENCH_WORDS)[:rng.randint(3, 6)].lower() for _ in range(queries)]
+    typos = [word[:2] + word[3:] + "s" for word in words]
+    return {
+        'load_text': (lambda _: load_inventory(), range(repeat), size),
+        'load_binary': (lambda _: load_binary_snapshot(binary_path), range(repeat), size),
+        'save_text': (lambda _: save_inventory(inventory), range(repeat), size),
+        'find_by_id': (lambda item_id: find_items(inventory, str(item_id)), ids, 1),
+        'search_name': (lambda word: inventory.search(word), words, 1),
+        'fuzzy_search': (lambda word: inventory.fuzzy_search(word), typos, 1),
+        'generate_new_id': (lambda _: generate_new_id(inventory), range(queries), 1),
+        'change_stock': (lambda item_id: change_stock(inventory, item_id, 1, 'bench'), ids, 1),
+    }
+
+# {size: {operation: summary}}; progress(size, operation) is called before each one
+def run_benchmarks(sizes=BENCH_SIZES, operations=BENCH_OPERATIONS, repeat=BENCH_REPEAT,
+                   queries=BENCH_QUERIES, seed=0, progress=None):
+    global file_path, storage, LEDGER_MODE
+    saved = file_path, storage, LEDGER_MODE, dict(journal)
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            for size in sizes:
+                close_journal()
+                journal.update(records=0, pending=0, offset=0)
+                file_path = os.path.join(folder, f"bench-{size}.txt")
+                storage = TextFileStorage()
+                LEDGER_MODE = False  # measure the inventory itself, not the ledger
+                write_synthetic_inventory(file_path, size, seed)
+                inventory = load_inventory()
+                rng = random.Random(seed)
+                inventory.search(BENCH_WORDS[0].lower())  # build the name index outside the timings
+                cases = benchmark_cases(inventory, size, repeat, queries, rng)
+                results[str(size)] = {}
+                for operation in operations:
+                    if progress:
+                        progress(size, operation)
+                    func, args, rows = cases[operation]
+                    args = list(args)
+                    summary = summarize_times(time_calls(func, args), rows)
+                    summary['peak_mb'] = round(peak_memory_mb(func, args[0]), 3)
+                    results[str(size)][operation] = summary
+                close_journal()
+    finally:
+        file_path, storage, LEDGER_MODE = saved[:3]
+        journal.update(saved[3])
+    return {'python': platform.python_version(), 'platform': platform.platform(),
+            'date': time.strftime("%Y-%m-%d %H:%M:%S"), 'results': results}
+
+# [(size, operation, p50 now, p50 before, change)] for everything in both runs
+def compare_benchmarks(current, baseline):
+    rows = []
+    for size, operations in current['results'].items():
+        for operation, summary in operations.items():
+            before = baseline.get('results', {}).get(size, {}).get(operation)
+            if before and before.get('p50_ms'):
+                rows.append((size, operation, summary['p50_ms'], before['p50_ms'],
+                             summary['p50_ms'] / before['p50_ms'] - 1))
+    return rows
+
+def format_benchmarks(report, comparison=None):
+    lines = ["Rows       Operation          p50 ms     p95 ms     p99 ms         per sec   peak MB",
+             "-------------------------------------------------------------------------------------"]
+    for size, operations in report['results'].items():
+        for operation, r in operations.items():
+            lines.append(f"{size:<10} {operation:<16} {r['p50_ms']:>9.3f}  {r['p95_ms']:>9.3f}  {r['p99_ms']:>9.3f}  "
+                         f"{r['per_sec'] or 0:>14,.0f}  {r['peak_mb']:>8.2f}")
+    if comparison:
+        lines += ["", "Rows       Operation          p50 ms   baseline     change",
+                  "----------------------------------------------------------"]
+        for size, operation, now, before, change in comparison:
+            flag = "  SLOWER" if change > BENCH_TOLERANCE else ""
+            lines.append(f"{size:<10} {operation:<16} {now:>9.3f}  {before:>9.3f}  {change:>+8.1%}{flag}")
+    return "\n".join(lines)
+
+#END OF BENCHMARK SECTION-------------
+
+
+#INSTRUMENTATION SECTION--------------
+# Opt-in timers and counters on the storage, lookup and core functions:
+#   IMS_STATS=1 (or --stats)                    count and time every call, print a summary on exit
+#   IMS_PROFILE=cpu / memory (or --profile)     also run cProfile / tracemalloc for the whole session
+# The functions are only wrapped when stats are turned on, so a normal run pays nothing.
+# A function's time includes the instrumented functions it calls (e.g. load_inventory
+# includes replay_journal). Bytes are counted where the file sizes show them:
+#   'file_read' / 'file_written'   the size of inventory.txt before / after the call
+#   'log_read' / 'log_written'     how far the call moved through inventory.txt.log
+STATS_ENABLED = os.environ.get('IMS_STATS', '') not in ('', '0')
+PROFILE_MODE = os.environ.get('IMS_PROFILE') or None  # 'cpu' or 'memory'
+INSTRUMENTED = (
+    ('load_inventory', 'file_read'), ('save_inventory', 'file_written'), ('replay_journal', 'log_read'),
+    ('append_journal', 'log_written'), ('sync_journal', None), ('compact_inventory', None),
+    ('load_binary_snapshot', None), ('save_binary_snapshot', None),
+    ('find_items', None), ('generate_new_id', None), ('next_free_id', None),
+    ('Inventory.search', None), ('Inventory.fuzzy_search', None), ('Inventory.sorted_rows', None),
+    ('create_item', None), ('modify_item', None), ('remove_item', None), ('change_stock', None),
+    ('adjust_stock_bulk', None), ('import_items', None), ('record_movements', None), ('take_snapshot', None),
+    ('TextFileStorage.refresh', None), ('TextFileStorage.save_changes', None), ('TextFileStorage.save_all', None),
+    ('SQLiteStorage.load', None), ('SQLiteStorage.write', None), ('SQLiteStorage.save_all', None),
+    ('SQLiteStorage.find', None),
+)
+op_stats = {}  # name -> {'times': array of seconds, 'read': bytes, 'written': bytes}
+profiler = None
+
+def inventory_file_size():
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return 0
+
+def instrument(func, name, measure):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if measure == 'file_read':
+            read = inventory_file_size()
+        start = time.perf_counter()
+        if measure == 'log_read':  # replay_journal(items, start=0) reads from start
+            log_start = args[1] if len(args) > 1 else kwargs.get('start', 0)
+        else:
+            log_start = journal['offset']
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            entry = op_stats.get(name)
+            if entry is None:
+                entry = op_stats[name] = {'times': array('d'), 'read': 0, 'written': 0}
+            entry['times'].append(elapsed)
+            if measure == 'file_read':
+                entry['read'] += read
+            elif measure == 'file_written':
+                entry['written'] += inventory_file_size()
+            elif measure == 'log_read':
+                entry['read'] += max(journal['offset'] - log_start, 0)
+            elif measure == 'log_written':
+                entry['written'] += max(journal['offset'] - log_start, 0)
+    wrapper.instrumented = True
+    return wrapper
+
+# Wrap everything in INSTRUMENTED (module functions and class methods) with timers
+def enable_stats():
+    module = globals()
+    for name, measure in INSTRUMENTED:
+        owner_name, _, attribute = name.rpartition(".")
+        owner = module[owner_name] if owner_name else None
+        func = getattr(owner, attribute) if owner else module[attribute]
+        if getattr(func, 'instrumented', False):
+            continue
+        if owner:
+            setattr(owner, attribute, instrument(func, name, measure))
+        else:
+            module[attribute] = instrument(func, name, measure)
+
+def start_instrumentation(stats=None, profile=None):
+    global STATS_ENABLED, PROFILE_MODE, profiler
+    STATS_ENABLED = STATS_ENABLED if stats is None else stats
+    PROFILE_MODE = profile or PROFILE_MODE
+    if STATS_ENABLED:
+        enable_stats()
+    if PROFILE_MODE == 'cpu':
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif PROFILE_MODE == 'memory':
+        tracemalloc.start(10)
+
+# {name: {'calls', 'total_ms', 'p50_ms', 'p99_ms', 'read_bytes', 'written_bytes'}}
+def stats_summary():
+    summary = {}
+    for name, entry in sorted(op_stats.items()):
+        times = sorted(entry['times'])
+        summary[name] = {'calls': len(times), 'total_ms': round(sum(times) * 1000, 3),
+                         'p50_ms': round(times[len(times) // 2] * 1000, 3),
+                         'p99_ms': round(times[min(len(times) - 1, int(len(times) * 0.99))] * 1000, 3),
+                         'read_bytes': entry['read'], 'written_bytes': entry['written']}
+    return summary
+
+def format_stats(summary):
+    lines = ["SESSION STATS",
+             "Operation                       Calls    Total ms     p50 ms     p99 ms    Bytes read  Bytes written",
+             "--------------------------------------------------------------------------------------------------"]
+    lines += [f"{name:<30} {s['calls']:>6}  {s['total_ms']:>10.1f}  {s['p50_ms']:>9.3f}  {s['p99_ms']:>9.3f}  "
+              f"{s['read_bytes']:>12,}  {s['written_bytes']:>13,}" for name, s in summary.items()]
+    return "\n".join(lines)
+
+# Stop profiling and print everything collected (to stderr, so --json output stays clean)
+def stop_instrumentation():
+    global profiler
+    if profiler is not None:
+        profiler.disable()
+        print("\nCPU PROFILE (top 25 by cumulative time)", file=sys.stderr)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(25)
+        profiler = None
+    if tracemalloc.is_tracing():
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"\nMEMORY PROFILE (now {current / 1024 / 1024:.1f} MB, peak {peak / 1024 / 1024:.1f} MB)", file=sys.stderr)
+        for stat in snapshot.statistics('lineno')[:15]:
+            print(f"  {stat}", file=sys.stderr)
+    if STATS_ENABLED and op_stats:
+        print("\n" + format_stats(stats_summary()), file=sys.stderr)
+
+#END OF INSTRUMENTATION SECTION-------------
+
+
+#COMMAND LINE SECTION--------------
+# Run one operation without the menu, e.g.
+#   python Inventory_Management_System_v4.1.py --json search sardines
+#   python Inventory_Management_System_v4.1.py adjust 3 -2
+def cli_value(input_type):
+    def parse(value):
+        try:
+            return validate_input(value.strip(), input_type)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(f"{value!r}: {e}")
+    parse.__name__ = input_type.__name__
+    return parse
+
+def build_cli_parser():
+    parser = argparse.ArgumentParser(description="Inventory Management System (run without arguments for the menu)")
+    parser.add_argument("--file", help="inventory file (or database) to use instead of the default one")
+    parser.add_argument("--backend", choices=("text", "sqlite"), default=None,
+                        help=f"storage backend (default: {STORAGE_BACKEND})")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    parser.add_argument("--stats", action="store_true", default=None,
+                        help="print call counts and timings on exit (or set IMS_STATS=1)")
+    parser.add_argument("--profile", choices=("cpu", "memory"),
+                        help="profile with cProfile or tracemalloc (or set IMS_PROFILE)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="add a new item")
+    add.add_argument("name")
+    add.add_argument("quantity", type=cli_value(int))
+    add.add_argument("price", type=cli_value(float))
+    add.add_argument("--id", type=cli_value(int), help="ID to use (auto-generated if omitted)")
+
+    view = commands.add_parser("view", help="list all items")
+    view.add_argument("--sort", choices=SORT_FIELDS, default="id")
+    view.add_argument("--desc", action="store_true", help="sort in descending order")
+    view.add_argument("--below", type=cli_value(int), help="only items with quantity below this")
+    view.add_argument("--page", type=cli_value(int), help="show only this page")
+    view.add_argument("--page-size", type=cli_value(int), default=PAGE_SIZE)
+
+    search = commands.add_parser("search", help="find items by ID or name")
+    search.add_argument("term")
+    search.add_argument("--fuzzy", action="store_true", help="rank by similarity (finds typos, plurals, ...)")
+    search.add_argument("--limit", type=cli_value(int), default=10, help="max results for --fuzzy (default 10)")
+
+    update = commands.add_parser("update", help="change an item's name, quantity or price")
+    update.add_argument("id", type=cli_value(int))
+    update.add_argument("--name", type=cli_value(str))
+    update.add_argument("--quantity", type=cli_value(int))
+    update.add_argument("--price", type=cli_value(float))
+
+    delete = commands.add_parser("delete", help="delete an item")
+    delete.add_argument("id", type=cli_value(int))
+
+    adjust = commands.add_parser("adjust", help="add or subtract stock, e.g. 'adjust 3 +5' or 'adjust 3 -2'")
+    adjust.add_argument("id", type=cli_value(int))
+    adjust.add_argument("change", type=int)
+    adjust.add_argument("--reason", default="adjust", help="recorded in the stock ledger, e.g. sale or restock")
+
+    adjust_bulk = commands.add_parser("adjust-bulk", help="apply an 'id,+/-qty' file ('-' reads stdin)")
+    adjust_bulk.add_argument("path")
+
+    commands.add_parser("low-stock", help=f"list items below their alert level (default: below {MIN_STOCK_ALERT})")
+
+    threshold = commands.add_parser("threshold", help="set an item's low stock alert level")
+    threshold.add_argument("id", type=cli_value(int))
+    threshold.add_argument("value", type=cli_value(int), nargs="?", help=f"omit to go back to {MIN_STOCK_ALERT}")
+
+    history = commands.add_parser("history", help="stock movements from the ledger")
+    history.add_argument("id", type=cli_value(int), nargs="?", help="only this item")
+    history.add_argument("--since", type=parse_day, help="first day, YYYY-MM-DD")
+    history.add_argument("--until", type=parse_day, help="last day, YYYY-MM-DD")
+    history.add_argument("--daily", action="store_true", help="totals per day instead of each movement")
+
+    serve = commands.add_parser("serve", help="run the HTTP/JSON API server")
+    serve.add_argument("--host", default=SERVER_HOST, help=f"address to listen on (default {SERVER_HOST})")
+    serve.add_argument("--port", type=int, default=SERVER_PORT, help=f"port (default {SERVER_PORT}, 0 picks a free one)")
+
+    bench = commands.add_parser("bench", help="benchmark load/save/search on generated inventories")
+    bench.add_argument("--sizes", default=",".join(map(str, BENCH_SIZES)),
+                       help="comma-separated row counts (default %(default)s)")
+    bench.add_argument("--ops", default=",".join(BENCH_OPERATIONS), help="comma-separated operations (default: all)")
+    bench.add_argument("--repeat", type=cli_value(int), default=BENCH_REPEAT, help="runs of each load/save")
+    bench.add_argument("--queries", type=cli_value(int), default=BENCH_QUERIES, help="calls of each lookup")
+    bench.add_argument("--output", help="save the results as JSON (e.g. a baseline)")
+    bench.add_argument("--baseline", help="compare with an earlier --output file")
+
+    commands.add_parser("snapshot", help="save a snapshot of the inventory now")
+    commands.add_parser("snapshots", help="list the saved snapshots")
+    restore = commands.add_parser("restore", help="put the inventory back to how it was at a time")
+    restore.add_argument("time", type=parse_time, help="'YYYY-MM-DD HH:MM[:SS]', or a date for the end of that day")
+
+    analytics = commands.add_parser("analytics", help="NumPy summary, price bands, quantity histogram and filters")
+    analytics.add_argument("--bins", type=cli_value(int), default=10, help="quantity histogram bins (default 10)")
+    analytics.add_argument("--value-above", type=float, help="select items whose quantity*price is above this")
+    analytics.add_argument("--quantity-below", type=int, help="select items with less stock than this")
+    analytics.add_argument("--price-min", type=float)
+    analytics.add_argument("--price-max", type=float)
+
+    report = commands.add_parser("report", help="stock value, price bands and the most valuable items")
+    report.add_argument("--top", type=cli_value(int), default=5, help="how many top items to list (default 5)")
+
+    convert = commands.add_parser("convert", help="rewrite inventory.txt in the text or the binary format")
+    convert.add_argument("format", choices=("text", "binary"))
+
+    import_cmd = commands.add_parser("import", help="import items from a CSV, JSONL or columnar (.imsc) file")
+    import_cmd.add_argument("path")
+
+    export = commands.add_parser("export", help="export items to a CSV, JSONL or columnar file ('-' writes to stdout)")
+    export.add_argument("path")
+    export.add_argument("--format", choices=EXPORT_FORMATS,
+                        help="defaults to the file extension (.csv, .jsonl, .imsc), else csv")
+    export.add_argument("--gzip", action="store_true", help="gzip the output (automatic for names ending in .gz)")
+    return parser
+
+def print_items(items, as_json):
+    if as_json:
+        print(json.dumps([dict(item) for item in items]))
+        return
+    print("ID    Name                 Qty    Price")
+    print("--------------------------------------")
+    for item in items:
+        print(f"{item['id']:<5} {item['name'][:18]:<18} {item['quantity']:>5}   ₱{item['price']:>7.2f}")
+
+# Same as print_items(..., as_json=True), written in chunks
+def write_json_rows(inventory, rows, chunk_size=1000):
+    sys.stdout.write("[")
+    for start in range(0, len(rows), chunk_size):
+        if start:
+            sys.stdout.write(", ")
+        sys.stdout.write(", ".join(json.dumps(dict(zip(ItemRow.FIELDS, inventory.row_values(row))))
+                                   for row in rows[start:start + chunk_size]))
+    sys.stdout.write("]\n")
+
+def print_result(result, as_json, message):
+    if as_json:
+        print(json.dumps(result))
+    else:
+        print(message)
+
+def run_command(args):
+    if args.command == "bench":
+        return run_bench_command(args)
+    if args.command == "search" and not args.fuzzy:
+        print_items(get_storage().find(args.term), args.json)
+        return
+    if args.command == "export":
+        fmt = args.format or export_format_for(args.path)
+        with open_export(args.path, fmt, args.gzip or args.path.lower().endswith(".gz")) as f:
+            count = export_items(get_storage().iter_rows(), f, fmt)
+        if args.path != "-":
+            print_result({'exported': count, 'path': args.path, 'format': fmt}, args.json,
+                         f"Exported {count} item(s) to {args.path}.")
+        return
+    inventory = get_storage().load()
+    if args.command == "add":
+        item = create_item(inventory, args.name, args.quantity, args.price, args.id)
+        print_result(item.to_dict(), args.json, f"Item '{item['name']}' (ID: {item['id']}) added.")
+    elif args.command == "search":
+        print_items(inventory.fuzzy_search(args.term, args.limit), args.json)
+    elif args.command == "view":
+        rows = inventory.sorted_rows(args.sort, args.desc, args.below)
+        if args.page:
+            rows = rows[(args.page - 1) * args.page_size:args.page * args.page_size]
+        if args.json:
+            write_json_rows(inventory, rows)
+        else:
+            write_item_rows(inventory, rows)
+    elif args.command == "update":
+        item = modify_item(inventory, args.id, args.name, args.quantity, args.price)
+        print_result(item.to_dict(), args.json, "Item updated successfully!")
+    elif args.command == "delete":
+        item = remove_item(inventory, args.id)
+        print_result(item, args.json, f"Item '{item['name']}' (ID: {item['id']}) deleted.")
+    elif args.command == "adjust":
+        new_quantity = change_stock(inventory, args.id, args.change, args.reason)
+        print_result({'id': args.id, 'quantity': new_quantity}, args.json, f"Stock updated. New quantity: {new_quantity}")
+    elif args.command == "adjust-bulk":
+        rows = parse_adjustment_lines(sys.stdin) if args.path == "-" else read_adjustment_rows(args.path)
+        applied, rejected = adjust_stock_bulk(inventory, rows)
+        print_result({'applied': applied, 'rejected': rejected}, args.json,
+                     f"Applied {applied} adjustment(s), rejected {len(rejected)}.")
+    elif args.command == "low-stock":
+        low = low_stock_items(inventory)
+        if args.json:
+            print(json.dumps([dict(item, threshold=threshold) for item, threshold in low]))
+        else:
+            print_items([item for item, _ in low], False)
+    elif args.command == "threshold":
+        value = set_stock_threshold(inventory, args.id, args.value)
+        print_result({'id': args.id, 'threshold': value}, args.json, f"ID {args.id} alerts below {value}.")
+    elif args.command == "history":
+        until = args.until + DAY_SECONDS - 0.001 if args.until is not None else None
+        if args.daily:
+            rollups = daily_rollups(args.id, args.since and ledger_day(args.since), until and ledger_day(until))
+            print_result([dict(zip(('day', 'received', 'issued', 'movements'), row)) for row in rollups],
+                         args.json, format_rollups(rollups))
+        else:
+            movements = list(item_movements(args.id, args.since, until))
+            names = {item['id']: item['name'] for item in map(inventory.get, {m[1] for m in movements}) if item}
+            print_result([dict(zip(('time', 'id', 'delta', 'reason'), m)) for m in movements],
+                         args.json, format_movements(movements, names))
+    elif args.command == "serve":
+        try:
+            asyncio.run(serve_inventory(inventory, args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        get_storage().close(inventory)
+    elif args.command == "snapshot":
+        taken = take_snapshot(inventory)
+        print_result({'time': taken}, args.json, "Snapshot saved.")
+    elif args.command == "snapshots":
+        snapshots = list_snapshots()
+        print_result([{key: value for key, value in read_manifest(path).items() if key != 'chunks'}
+                      for _, path in snapshots], args.json,
+                     format_snapshots(snapshots))
+    elif args.command == "restore":
+        count = restore_inventory(inventory, args.time)
+        print_result({'items': count}, args.json, f"Restored {count} item(s).")
+    elif args.command == "analytics":
+        view = inventory.analytics
+        result = {'summary': view.summary(), 'price_bands': view.value_by_price_band(),
+                  'quantity_histogram': view.quantity_histogram(args.bins)}
+        filters = {'value_above': args.value_above, 'quantity_below': args.quantity_below,
+                   'price_min': args.price_min, 'price_max': args.price_max}
+        if any(value is not None for value in filters.values()):
+            result['selected'] = view.select(**filters)
+        print_result(result, args.json, format_analytics(result))
+    elif args.command == "report":
+        report = inventory_report(inventory, args.top)
+        print_result(report, args.json, format_report(report))
+    elif args.command == "convert":
+        if not isinstance(getattr(storage, 'backend', storage), TextFileStorage):
+            raise ValueError("convert only applies to the text backend")
+        count = convert_inventory(inventory, args.format)
+        print_result({'items': count, 'format': args.format}, args.json,
+                     f"Saved {count} item(s) in the {args.format} format.")
+    elif args.command == "import":
+        added, errors = import_items(inventory, args.path)
+        print_result({'added': added, 'errors': errors}, args.json,
+                     f"Imported {added} item(s), skipped {len(errors)} row(s).")
+
+def run_bench_command(args):
+    operations = [op.strip() for op in args.ops.split(",") if op.strip()]
+    unknown = set(operations) - set(BENCH_OPERATIONS)
+    if unknown:
+        raise ValueError(f"Unknown operation(s): {', '.join(sorted(unknown))}")
+    try:
+        sizes = [validate_input(size.strip(), int) for size in args.sizes.split(",")]
+    except ValueError as e:
+        raise ValueError(f"--sizes: {e}")
+    progress = None if args.json else lambda size, op: print(f"  {size} rows: {op}...", file=sys.stderr)
+    report = run_benchmarks(sizes, operations, args.repeat, args.queries, progress=progress)
+    comparison = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            comparison = compare_benchmarks(report, json.load(f))
+        report['regressions'] = [row[:2] for row in comparison if row[4] > BENCH_TOLERANCE]
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    print_result(report, args.json, format_benchmarks(report, comparison))
+    return 1 if report.get('regressions') else 0
+
+# Returns the exit code: 0 on success, 1 if the operation failed
+def run_cli(argv):
+    global file_path, storage
+    args = build_cli_parser().parse_args(argv)
+    backend = args.backend or STORAGE_BACKEND
+    if args.file and backend == 'text':
+        file_path = args.file
+    start_instrumentation(args.stats, args.profile)
+    try:
+        if backend == 'text':
+            initialize_inventory_file()
+        storage = open_storage(backend, args.file, write_behind=False)  # one change per run, save it right away
+        if run_command(args):
+            return 1
+    except (ValueError, OSError, sqlite3.Error) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if storage is not None:
+            storage.close()
+        stop_instrumentation()
+    return 0
+
+#END OF COMMAND LINE SECTION-------------
+
 #Main
 def main():
-    initialize_inventory_file()
-    inventory = load_inventory()
-    display_welcome()
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
+    start_instrumentation()
+    if STORAGE_BACKEND == 'text':
+        initialize_inventory_file()
+    inventory = get_storage().load()
+    # SIGTERM (e.g. the terminal is closed) exits through the finally below, so nothing is lost
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signum, frame: sys.exit(0))
+    try:
+        display_welcome()
+        run_menu(inventory)
+    finally:
+        get_storage().close(inventory)
+        stop_instrumentation()
 
+def run_menu(inventory):
     #Loop
     while True:
+        if not isinstance(get_storage(), WriteBehindStorage):  # else its thread takes them
+            auto_snapshot(inventory)
+        sync_storage()  # nothing is left unsynced while waiting for the user
         display_main_menu()
-        choice = get_valid_input("\nSelect an option (0-7): ", int, allow_back=False)
+        choice = get_valid_input("\nSelect an option (0-13): ", int, allow_back=False)
 
         if choice == 1:
             add_item(inventory)
@@ -349,12 +3852,24 @@ def main():
             adjust_stock(inventory)
         elif choice == 7:
             show_credits()
+        elif choice == 8:
+            import_items_menu(inventory)
+        elif choice == 9:
+            bulk_adjust_stock_menu(inventory)
+        elif choice == 10:
+            low_stock_menu(inventory)
+        elif choice == 11:
+            report_menu(inventory)
+        elif choice == 12:
+            movement_history_menu(inventory)
+        elif choice == 13:
+            snapshots_menu(inventory)
         elif choice == 0:
             print("\nThank you for using the Inventory Management System!")
             print("Goodbye!")
             break
         else:
-            print("Invalid option. Please select 0-7.")
+            print("Invalid option. Please select 0-13.")
             input("\nPress Enter to continue...")
 
 if __name__ == "__main__":